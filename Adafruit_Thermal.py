@@ -35,11 +35,204 @@
 # Python 2.X code using the library usu. needs to include the next line:
 from __future__ import print_function
 from serial import Serial
-import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import bisect, json, os, time
+try:
+	from configparser import ConfigParser
+except ImportError: # Python 2.X
+	from ConfigParser import SafeConfigParser as ConfigParser
+
+# Pacing uses a monotonic clock where available (Python 3.3+) so that
+# wall-clock adjustments (e.g. NTP on the Pi) can't stall or rush output.
+monotonic = getattr(time, 'monotonic', time.time)
+
+# Converts text (str or unicode) to a bytearray for sending.
+def textBytes(text):
+	if isinstance(text, (bytes, bytearray)):
+		return bytearray(text)
+	return bytearray(text.encode('latin-1', 'replace'))
+
+
+# Because there's no flow control between the printer and computer
+# in the stock wiring, special care must be taken to avoid overrunning
+# the printer's buffer.  A pacer decides when output may proceed; the
+# printer calls set() with the estimated duration of each task it
+# issues and wait() before issuing the next one (wait() returns True if
+# it actually had to wait, for job stats).  Two strategies are
+# provided, selected per device with the 'pacing' argument to
+# Adafruit_Thermal (or by passing a pacer instance):
+
+# Estimate-based pacing (the default).  Serial output is throttled based
+# on serial speed as well as an estimate of the device's print and feed
+# rates (relatively slow, being bound to moving parts and physical
+# reality).  After an operation is issued to the printer (e.g. bitmap
+# print), a timeout is set before which any other printer operations
+# will be suspended.  This is generally more efficient than using a
+# delay in that it allows the calling code to continue with other
+# duties (e.g. receiving or decoding an image) while the printer
+# physically completes the task.
+#
+# When a wait is needed, the calling thread sleeps until the deadline
+# rather than spinning, leaving the CPU free for other threads (web
+# server, image decoding).  Because sleep() may overshoot slightly, the
+# last 'spinTime' seconds before the deadline are busy-waited for
+# precision.  Set spinTime to 0 to never spin at all.
+#
+# The clock and sleep functions may be replaced, e.g. by an emulated
+# printer's virtual clock (see emulator.py).
+class EstimatePacer(object):
+
+	spinTime   = 0.0005
+	resumeTime = 0.0
+
+	def __init__(self, spinTime=None, clock=monotonic, sleep=time.sleep):
+		if spinTime is not None:
+			self.spinTime = spinTime
+		self.clock = clock
+		self.sleep = sleep
+
+	# Sets estimated completion time for a just-issued task.
+	def set(self, x):
+		self.resumeTime = self.clock() + x
+
+	# Adds to the estimated completion time of the current task.
+	def extend(self, x):
+		self.resumeTime += x
+
+	# Holds off further output for a fixed time (e.g. while the
+	# printer boots), whatever the state of its buffer.
+	def delay(self, x):
+		self.set(x)
+
+	# Waits (if necessary) for the prior task to complete.  Returns
+	# True if it had to wait.
+	def wait(self):
+		remaining = self.resumeTime - self.clock()
+		waited    = remaining > 0
+		while remaining > 0:
+			if remaining > self.spinTime:
+				self.sleep(remaining - self.spinTime)
+			remaining = self.resumeTime - self.clock()
+		return waited
+
+
+# Handshake-based pacing.  Some printer firmware raises its DTR line
+# while its buffer is full; wired to the computer's CTS (or DSR) input,
+# this lets the serial driver hold off output in hardware, and all
+# software timeouts are dropped.  'line' selects which input the
+# printer's DTR is connected to: 'cts' (rtscts handshaking, the usual
+# choice) or 'dsr' (dsrdtr handshaking).  Fixed delays that aren't about
+# the buffer (cold boot, wake()) are still observed.
+class HandshakePacer(object):
+
+	delayTime = 0.0 # End of the current fixed delay
+
+	def __init__(self, line='cts'):
+		if line.lower() == 'dsr':
+			self.serialOptions = { 'dsrdtr': True }
+		else:
+			self.serialOptions = { 'rtscts': True }
+
+	def set(self, x):
+		pass
+
+	def extend(self, x):
+		pass
+
+	def delay(self, x):
+		self.delayTime = monotonic() + x
+
+	def wait(self):
+		remaining = self.delayTime - monotonic()
+		if remaining > 0:
+			time.sleep(remaining)
+		return remaining > 0
+
+
+# Where the time goes in a print job.  While a job is open (see
+# Adafruit_Thermal.job()) the printer counts into one of these:
+#
+#   bytes        - bytes sent
+#   writes       - serial writes issued
+#   writeTime    - time spent in those writes (includes any blocking by
+#                  the serial driver, e.g. for handshaking)
+#   stalls       - timeoutWait() calls that had to wait
+#   stallTime    - total time spent waiting in them
+#   histogram    - stall counts by duration; histogram[i] counts stalls
+#                  shorter than buckets[i] (the last, any longer)
+#   modeledTime  - sum of the print/feed/transfer times estimated by the
+#                  driver for everything issued
+#   firstByte    - time from opening the job to its first write
+#   latency      - time from the job being queued (see printer.py's
+#                  PrintWorker) to its first write
+#   elapsed      - time from opening to closing the job
+#   estimated    - time from opening the job until the printer is
+#                  expected to be idle (estimate-based pacing only)
+#
+# Comparing 'estimated' with a stopwatch (or an emulator's jobTime)
+# shows how well dotPrintTime and dotFeedTime fit; a large stallTime
+# means the host is mostly waiting on the mechanism.
+class JobStats(object):
+
+	buckets = (0.001, 0.01, 0.1, 1.0, 10.0) # Seconds
+
+	def __init__(self, name=None, clock=monotonic, enqueued=None):
+		self.name        = name
+		self.clock       = clock
+		self.start       = clock()
+		self.enqueued    = enqueued
+		self.firstByte   = None
+		self.latency     = None
+		self.bytes       = 0
+		self.writes      = 0
+		self.writeTime   = 0.0
+		self.stalls      = 0
+		self.stallTime   = 0.0
+		self.histogram   = [ 0 ] * (len(self.buckets) + 1)
+		self.modeledTime = 0.0
+		self.elapsed     = 0.0
+		self.estimated   = None
+
+	def stall(self, seconds):
+		self.stalls    += 1
+		self.stallTime += seconds
+		self.histogram[bisect.bisect(self.buckets, seconds)] += 1
+
+	def finish(self, pacer):
+		self.elapsed = self.clock() - self.start
+		if self.enqueued is not None:
+			first = self.firstByte
+			if first is None:
+				first = self.start + self.elapsed
+			self.latency = first - self.enqueued
+		if hasattr(pacer, 'resumeTime'):
+			self.estimated = max(self.elapsed,
+			  pacer.resumeTime - self.start)
+
+	def asDict(self):
+		return { 'name'       : self.name,
+		         'bytes'      : self.bytes,
+		         'writes'     : self.writes,
+		         'writeTime'  : self.writeTime,
+		         'stalls'     : self.stalls,
+		         'stallTime'  : self.stallTime,
+		         'histogram'  : self.histogram,
+		         'buckets'    : list(self.buckets),
+		         'modeledTime': self.modeledTime,
+		         'firstByte'  : None if self.firstByte is None else
+		                        self.firstByte - self.start,
+		         'latency'    : self.latency,
+		         'elapsed'    : self.elapsed,
+		         'estimated'  : self.estimated }
+
+	# One line of JSON, for appending to a log.
+	def json(self):
+		return json.dumps(self.asDict(), sort_keys=True)
+
 
 class Adafruit_Thermal(Serial):
 
-	resumeTime      =  0.0
 	byteTime        =  0.0
 	dotPrintTime    =  0.033
 	dotFeedTime     =  0.0025
@@ -52,11 +245,32 @@ class Adafruit_Thermal(Serial):
 	printMode       =  0
 	defaultHeatTime = 60
 	defaultHeatDots = 32
+	cmdBufSize      = 64
+	cmdLen          =  0
+	batchDepth      =  0
+	profilePath     = os.path.expanduser('~/.Adafruit_Thermal.cfg')
+	bitmapCache     = None
+	logoRegistry    = None
+	nvWriteTime     =  2.0 # Allowance for storing NV images (FS q)
+	definedHeight   =  0   # Height of image stored by defineImage()
+	transport       = None
+	bytesSaved      =  0
+	commandsSaved   =  0
+	blankRowsMin    =  4
+	bufferSize      = 4096 # Printer's receive buffer, bytes
+	trimBitmaps     = False
+	rasterBitmaps   = False # Use GS v 0 rather than DC2 * for bitmaps
+	rasterMaxHeight = 65535
+	baudRates       = (9600, 19200, 38400, 57600, 115200)
+	stats           = None # JobStats of the job in progress, if any
+	bytesSent       = 0    # Total output, to tell if anything was sent
+	statsLog        = os.environ.get('ADAFRUIT_THERMAL_STATS')
 
 	def __init__(self, *args, **kwargs):
 		# If no parameters given, use default port & baud rate.
 		# If only port is passed, use default baud rate.
-		# If both passed, use those values.
+		# If both passed, use those values.  Baud rate 'auto' finds
+		# the rate the printer is set to (see probeBaudrate()).
 		baudrate = 9600
 		if len(args) == 0:
 			args = [ "/dev/ttyAMA0", baudrate ]
@@ -64,6 +278,10 @@ class Adafruit_Thermal(Serial):
 			args = [ args[0], baudrate ]
 		else:
 			baudrate = args[1]
+		autoBaud = (baudrate == 'auto')
+		if autoBaud:
+			baudrate = 9600
+			args     = [ args[0], baudrate ] + list(args[2:])
 
 		# Calculate time to issue one byte to the printer.
 		# 11 bits (not 8) to accommodate idle, start and stop bits.
@@ -71,6 +289,51 @@ class Adafruit_Thermal(Serial):
 		# caution here.
 		self.byteTime = 11.0 / float(baudrate)
 
+		# Driver-specific settings are removed from kwargs before
+		# they're passed along to Serial.
+		heatTime = kwargs.pop('heattime', self.defaultHeatTime)
+		heatDots = kwargs.pop('heatdots', self.defaultHeatDots)
+		spinTime = kwargs.pop('spintime', None)
+		profile  = kwargs.pop('profile', self.profilePath)
+		raster   = kwargs.pop('raster', None) # See probeRaster()
+		self.bitmapCache = kwargs.pop('cache', None) # See bitmapcache.py
+		self.logoRegistry = kwargs.pop('logos', None) # See logos.py
+		self.statsLog = kwargs.pop('statslog', self.statsLog) # See job()
+
+		# Output normally goes to the serial port, but any object
+		# with write() and read() methods may be given as the
+		# transport instead (e.g. emulator.PrinterEmulator); the
+		# port is then left closed.  A transport that provides its
+		# own clock() and sleep() also takes over the pacing clock.
+		self.transport = kwargs.pop('transport', None)
+		if self.transport is not None:
+			args = [ None, baudrate ]
+
+		# Select pacing strategy: 'estimate' (default), 'handshake'
+		# or a pacer object.  Handshake pacing supplies the Serial
+		# options (rtscts/dsrdtr) it depends on, unless given.
+		pacing = kwargs.pop('pacing', 'estimate')
+		if pacing == 'handshake':
+			self.pacer = HandshakePacer()
+		elif pacing == 'estimate':
+			if hasattr(self.transport, 'clock'):
+				# No spinning on a virtual clock
+				self.pacer = EstimatePacer(0,
+				  self.transport.clock, self.transport.sleep)
+			else:
+				self.pacer = EstimatePacer(spinTime)
+		else:
+			self.pacer = pacing
+		for key, value in getattr(
+		  self.pacer, 'serialOptions', {}).items():
+			kwargs.setdefault(key, value)
+
+		# Command bytes are staged here and issued in one write;
+		# see writeBytes().
+		self.cmdBuf = bytearray(self.cmdBufSize)
+		self.shadow    = {} # See writeState()
+		self.stateArgs = OrderedDict()
+
 		Serial.__init__(self, *args, **kwargs)
 
 		# Remainder of this method was previously in begin()
@@ -79,7 +342,10 @@ class Adafruit_Thermal(Serial):
 		# power up -- it needs a moment to cold boot and initialize.
 		# Allow at least 1/2 sec of uptime before printer can
 		# receive data.
-		self.timeoutSet(0.5)
+		self.timeoutDelay(0.5)
+
+		if autoBaud:
+			self.probeBaudrate()
 
 		self.wake()
 		self.reset()
@@ -98,8 +364,7 @@ class Adafruit_Thermal(Serial):
 		# blank page may occur.  The more heating interval, the more
 		# clear, but the slower printing speed.
 
-		heatTime = kwargs.get('heattime', self.defaultHeatTime)
-		heatDots = kwargs.get('heatdots', self.defaultHeatDots)
+		self.beginBatch()
 		self.writeBytes(
 		  27,       # Esc
 		  55,       # 7 (print settings)
@@ -123,30 +388,58 @@ class Adafruit_Thermal(Serial):
 		  18, # DC2
 		  35, # Print density
 		  (printBreakTime << 5) | printDensity)
+		self.endBatch()
 
 		self.dotPrintTime = 0.03
 		self.dotFeedTime  = 0.0021
 
+		# Use measured times for this unit if 'calibrate.py times'
+		# has been run (pass profile=None to skip).
+		if profile:
+			self.loadProfile(profile)
+
+		if raster == 'auto':
+			self.probeRaster()
+		elif raster is not None:
+			self.rasterBitmaps = bool(raster)
 
-	# Because there's no flow control between the printer and computer,
-	# special care must be taken to avoid overrunning the printer's
-	# buffer.  Serial output is throttled based on serial speed as well
-	# as an estimate of the device's print and feed rates (relatively
-	# slow, being bound to moving parts and physical reality).  After
-	# an operation is issued to the printer (e.g. bitmap print), a
-	# timeout is set before which any other printer operations will be
-	# suspended.  This is generally more efficient than using a delay
-	# in that it allows the calling code to continue with other duties
-	# (e.g. receiving or decoding an image) while the printer
-	# physically completes the task.
+
+	# Output pacing is delegated to self.pacer (see EstimatePacer and
+	# HandshakePacer above).
 
 	# Sets estimated completion time for a just-issued task.
 	def timeoutSet(self, x):
-		self.resumeTime = time.time() + x
+		self.pacer.set(x)
+		if self.stats is not None and x > 0:
+			self.stats.modeledTime += x
+
+	# Adds to the estimated completion time of the current task.
+	def timeoutExtend(self, x):
+		self.pacer.extend(x)
+		if self.stats is not None:
+			self.stats.modeledTime += x
+
+	# Holds off output for a fixed time regardless of pacing strategy
+	# (handshaking only covers buffer fullness).  Pacer objects given
+	# without a delay() method get a plain timeout instead.
+	def timeoutDelay(self, x):
+		getattr(self.pacer, 'delay', self.pacer.set)(x)
 
 	# Waits (if necessary) for the prior task to complete.
 	def timeoutWait(self):
-		while (time.time() - self.resumeTime) < 0: pass
+		if self.stats is None:
+			self.pacer.wait()
+			return
+		t      = self.stats.clock()
+		waited = self.pacer.wait() # Pacers say if they waited
+		t      = self.stats.clock() - t
+		if waited:
+			self.stats.stall(t)
+
+	# Sets the busy-wait portion of timeoutWait(), in seconds
+	# (estimate-based pacing only).
+	def setSpinTime(self, seconds):
+		self.pacer.spinTime = max(0.0, seconds)
 
 
 	# Printer performance may vary based on the power supply voltage,
@@ -167,44 +460,209 @@ class Adafruit_Thermal(Serial):
 		self.dotFeedTime  = f / 1000000.0
 
 
-	# 'Raw' byte-writing method
+	# Print and feed times measured by 'calibrate.py times' are kept
+	# in a configuration file (~/.Adafruit_Thermal.cfg by default),
+	# one section per serial port, in the same microsecond units as
+	# setTimes():
+	#
+	#   [/dev/ttyAMA0]
+	#   printtime = 28500
+	#   feedtime = 1830
+	#   raster = yes
+	#
+	# ('raster' is optional; see probeRaster().)  loadProfile() is
+	# called from __init__.  Returns True if times for this port (or
+	# the port named) were found and applied.
+	def loadProfile(self, path=None, port=None):
+		port   = port or self.port
+		config = ConfigParser()
+		if not config.read(path or self.profilePath):
+			return False
+		if not port or not config.has_section(port):
+			return False
+		self.setTimes(
+		  config.getfloat(port, 'printtime'),
+		  config.getfloat(port, 'feedtime'))
+		if config.has_option(port, 'raster'):
+			self.rasterBitmaps = config.getboolean(port, 'raster')
+		return True
+
+	# Saves the current print and feed times (and bitmap command) for
+	# this port, keeping any other ports' settings already in the file.
+	def saveProfile(self, path=None):
+		path   = path or self.profilePath
+		config = ConfigParser()
+		config.read(path)
+		if not config.has_section(self.port):
+			config.add_section(self.port)
+		config.set(self.port, 'printtime',
+		  '%d' % round(self.dotPrintTime * 1000000.0))
+		config.set(self.port, 'feedtime',
+		  '%d' % round(self.dotFeedTime * 1000000.0))
+		config.set(self.port, 'raster',
+		  'yes' if self.rasterBitmaps else 'no')
+		with open(path, 'w') as f:
+			config.write(f)
+
+
+	# 'Raw' byte-writing method.  Command bytes are staged in a
+	# preallocated buffer and issued with a single serial write rather
+	# than one write per byte.  Normally that happens at the end of
+	# each call, but between beginBatch() and endBatch() commands keep
+	# accumulating and go out together, so a multi-command operation
+	# such as setDefault() costs one write (and one timeout) in total.
 	def writeBytes(self, *args):
-		self.timeoutWait()
-		self.timeoutSet(len(args) * self.byteTime)
-		for arg in args:
-			super(Adafruit_Thermal, self).write(chr(arg))
+		n = self.cmdLen + len(args)
+		if n > len(self.cmdBuf):
+			self.sendCommands()
+			n = len(args)
+		self.cmdBuf[self.cmdLen:n] = bytearray(args)
+		self.cmdLen = n
+		if self.batchDepth == 0:
+			self.sendCommands()
+
+	# Issues any staged command bytes to the printer.
+	def sendCommands(self):
+		if self.cmdLen > 0:
+			self.timeoutWait()
+			self.timeoutSet(self.cmdLen * self.byteTime)
+			self.sendRaw(memoryview(self.cmdBuf)[:self.cmdLen])
+			self.cmdLen = 0
+
+	# All output to and input from the printer goes through these,
+	# to the serial port or the transport given to __init__.
+	def sendRaw(self, data):
+		if self.stats is not None:
+			t = self.stats.clock()
+			if self.stats.firstByte is None:
+				self.stats.firstByte = t
+		if self.transport is None:
+			Serial.write(self, data)
+		else:
+			self.transport.write(data)
+		self.bytesSent += len(data)
+		if self.stats is not None:
+			self.stats.bytes     += len(data)
+			self.stats.writes    += 1
+			self.stats.writeTime += self.stats.clock() - t
+
+	def readRaw(self, size=1):
+		if self.transport is None:
+			return Serial.read(self, size)
+		return self.transport.read(size)
+
+	# Batches may nest; commands are issued when the outermost
+	# batch ends.  Any other output (text, bitmaps) flushes the
+	# batch first so ordering is always preserved.
+	def beginBatch(self):
+		self.batchDepth += 1
+
+	def endBatch(self):
+		self.batchDepth -= 1
+		if self.batchDepth <= 0:
+			self.batchDepth = 0
+			self.sendCommands()
+
+	@contextmanager
+	def batch(self):
+		self.beginBatch()
+		try:
+			yield self
+		finally:
+			self.endBatch()
+
+	# Collects JobStats (above) for everything printed in the block:
+	#
+	#   with printer.job('receipt') as stats:
+	#     ...
+	#   print(stats.asDict())
+	#
+	# When the block ends the stats are passed to callback, if given,
+	# and appended as a line of JSON to statsLog if that's set (a file
+	# name or open file; the 'statslog' argument, or the environment
+	# variable ADAFRUIT_THERMAL_STATS by default).  Jobs don't nest;
+	# an inner job collects in place of the outer one until it ends.
+	# 'enqueued' is when the job was queued, on the pacing clock, if
+	# its latency is wanted.
+	@contextmanager
+	def job(self, name=None, callback=None, enqueued=None):
+		self.sendCommands()
+		outer = self.stats
+		stats = JobStats(name,
+		  getattr(self.pacer, 'clock', monotonic), enqueued)
+		self.stats = stats
+		try:
+			yield stats
+			self.sendCommands()
+		finally:
+			self.stats = outer
+			stats.finish(self.pacer)
+			if callback is not None:
+				callback(stats)
+			if self.statsLog:
+				self.logStats(stats)
+
+	def logStats(self, stats):
+		line = stats.json() + '\n'
+		if hasattr(self.statsLog, 'write'):
+			self.statsLog.write(line)
+			self.statsLog.flush()
+		else:
+			with open(self.statsLog, 'a') as f:
+				f.write(line)
 
 
-	# Override write() method to keep track of paper feed.
+	# Override write() method to keep track of paper feed.  Rather
+	# than issuing text a character at a time, each string is split
+	# up front into lines (at newlines, or where a line reaches
+	# maxColumn and wraps), and each line is sent with a single write
+	# and a single timeout covering its serial and print time.
 	def write(self, *data):
-		for i in range(len(data)):
-			c = data[i]
-			if c != 0x13:
-				self.timeoutWait()
-				super(Adafruit_Thermal, self).write(c)
-				d = self.byteTime
-				if ((c == '\n') or
-				    (self.column == self.maxColumn)):
-					# Newline or wrap
-					if self.prevByte == '\n':
-						# Feed line (blank)
-						d += ((self.charHeight +
-						       self.lineSpacing) *
-						      self.dotFeedTime)
-					else:
-						# Text line
-						d += ((self.charHeight *
-						       self.dotPrintTime) +
-						      (self.lineSpacing *
-						       self.dotFeedTime))
-						self.column = 0
-						# Treat wrap as newline
-						# on next pass
-						c = '\n'
+		self.sendCommands()
+		for text in data:
+			buf = textBytes(text)
+			if 0x13 in buf:
+				buf = buf.replace(b'\x13', b'')
+			n     = len(buf)
+			start = 0 # Start of text not yet sent
+			pos   = 0 # Start of text not yet laid out
+			while pos < n:
+				nl = buf.find(b'\n', pos)
+				if nl < 0:
+					nl = n
+				room = max(0, self.maxColumn - self.column)
+				if nl - pos > room:
+					end = pos + room # Wrap at this character
+				elif nl < n:
+					end = nl         # Newline
+				else:
+					# Partial line, print time comes later
+					self.column  += n - pos
+					self.prevByte = chr(buf[n - 1])
+					break
+				if end == pos and self.prevByte == '\n':
+					# Feed line (blank)
+					d = ((self.charHeight + self.lineSpacing) *
+					     self.dotFeedTime)
 				else:
-					self.column += 1
-				self.timeoutSet(d)
-				self.prevByte = c
+					# Text line
+					d = ((self.charHeight * self.dotPrintTime) +
+					     (self.lineSpacing * self.dotFeedTime))
+					self.column = 0
+				# Wrap is treated as newline on next pass
+				self.prevByte = '\n'
+				pos = end + 1
+				self.writeText(buf, start, pos, d)
+				start = pos
+			if start < n:
+				self.writeText(buf, start, n, 0)
+
+	# Issues buf[start:end] followed by a timeout of its serial time
+	# plus 'd' seconds.
+	def writeText(self, buf, start, end, d):
+		self.timeoutWait()
+		self.sendRaw(memoryview(buf)[start:end])
+		self.timeoutSet((end - start) * self.byteTime + d)
 
 
 	# The bulk of this method was moved into __init__,
@@ -226,22 +684,86 @@ class Adafruit_Thermal(Serial):
 		self.charHeight    = 24
 		self.lineSpacing   =  8
 		self.barcodeHeight = 50
+		self.printMode     =  0
 		self.writeBytes(27, 64)
+		self.shadow    = dict((key, value) for key, (value, args)
+		                 in self.resetState.items())
+		self.stateArgs = OrderedDict((key, args) for key, (value, args)
+		                 in self.resetState.items())
+
+	# Known state following ESC @: each setting's value, and the
+	# command that would set it
+	resetState = { 'printMode'    : (  0, (27,  33, 0)),
+	               'justify'      : (  0, (27,  97, 0)),
+	               'upsideDown'   : (  0, (27, 123, 0, 0)),
+	               'sideways'     : (  0, (27,  86, 0)),
+	               'lineHeight'   : ( 32, (27,  51, 32)),
+	               'underline'    : (  0, (27,  45, 0)),
+	               'barcodeHeight': ( 50, (29, 104, 50)),
+	               'size'         : (  0, (29,  33, 0)),
+	               'leftMargin'   : (  0, (29,  76, 0, 0)),
+	               'printWidth'   : (384, (29,  87, 384 & 0xFF, 384 >> 8)) }
+
+
+	# The driver keeps a shadow copy of the printer's mode settings
+	# (print mode, justification, line height, size, etc.) so that
+	# commands which wouldn't change anything can be skipped.  This
+	# sends the command in 'args' only if setting 'key' isn't already
+	# 'value', tallying what was saved in bytesSaved and commandsSaved.
+	# The last command sent for each setting is kept in stateArgs, in
+	# the order sent, so the whole state can be re-sent (see
+	# splitPoint()).
+	def writeState(self, key, value, *args):
+		if self.shadow.get(key) == value:
+			self.bytesSaved    += len(args)
+			self.commandsSaved += 1
+		else:
+			self.shadow[key] = value
+			# A setting's command may also change another's
+			# (see overlaps), whose shadow is then unknown
+			self.shadow.pop(self.overlaps.get(key), None)
+			self.stateArgs.pop(key, None)
+			self.stateArgs[key] = args
+			self.writeBytes(*args)
+
+	# ESC ! (print mode) and GS ! (size) both set the character size;
+	# whichever the printer got last applies.
+	overlaps = { 'printMode': 'size', 'size': 'printMode' }
+
+	# Forgets the shadowed state, so every setting is sent the next
+	# time it's used.  Call this if something other than this object
+	# may have changed the printer's settings (e.g. a power cycle).
+	def invalidateState(self):
+		self.shadow    = {}
+		self.stateArgs = OrderedDict()
+
+
+	# Marks a point where a compiled job may be interrupted for another
+	# (see scheduler.py): between bitmap chunks.  The transport, if it
+	# takes note (printjob.JobRecorder does), is given the commands that
+	# re-establish the mode settings in effect here.
+	def splitPoint(self):
+		mark = getattr(self.transport, 'mark', None)
+		if mark is not None:
+			self.sendCommands()
+			mark(bytearray().join(
+			  bytearray(a) for a in self.stateArgs.values()))
 
 
 	# Reset text formatting parameters.
 	def setDefault(self):
-		self.online()
-		self.justify('L')
-		self.inverseOff()
-		self.upsideDownOff()
-		self.sidewaysOff()
-		self.doubleHeightOff()
-		self.setLineHeight(32)
-		self.boldOff()
-		self.underlineOff()
-		self.setBarcodeHeight(50)
-		self.setSize('s')
+		with self.batch():
+			self.online()
+			self.justify('L')
+			self.inverseOff()
+			self.upsideDownOff()
+			self.sidewaysOff()
+			self.doubleHeightOff()
+			self.setLineHeight(32)
+			self.boldOff()
+			self.underlineOff()
+			self.setBarcodeHeight(50)
+			self.setSize('s')
 
 
 	def test(self):
@@ -264,14 +786,14 @@ class Adafruit_Thermal(Serial):
 	MSI     = 10
 
 	def printBarcode(self, text, type):
-		self.writeBytes(
-		  29,  72, 2,    # Print label below barcode
-		  29, 119, 3,    # Barcode width
-		  29, 107, type) # Barcode type
-		# Print string
-		self.timeoutWait()
-		self.timeoutSet((self.barcodeHeight + 40) * self.dotPrintTime)
-		super(Adafruit_Thermal, self).write(text)
+		# Settings, type and string are issued as one write
+		with self.batch():
+			self.writeBytes(
+			  29,  72, 2,    # Print label below barcode
+			  29, 119, 3,    # Barcode width
+			  29, 107, type) # Barcode type
+			self.writeBytes(*textBytes(text)) # Print string
+		self.timeoutExtend((self.barcodeHeight + 40) * self.dotPrintTime)
 		self.prevByte = '\n'
 		self.feed(2)
 
@@ -279,7 +801,7 @@ class Adafruit_Thermal(Serial):
 		if val < 1:
 			val = 1
 		self.barcodeHeight = val
-		self.writeBytes(29, 104, val)
+		self.writeState('barcodeHeight', val, 29, 104, val)
 
 
 	# === Character commands ===
@@ -316,7 +838,8 @@ class Adafruit_Thermal(Serial):
 			self.maxColumn  = 32
 
 	def writePrintMode(self):
-		self.writeBytes(27, 33, self.printMode)
+		self.writeState('printMode', self.printMode,
+		  27, 33, self.printMode)
 
 	def normal(self):
 		self.printMode = 0
@@ -329,16 +852,16 @@ class Adafruit_Thermal(Serial):
 		self.unsetPrintMode(self.INVERSE_MASK)
 
 	def upsideDownOn(self):
-		self.writeBytes(27, 123, 1, 0)
+		self.writeState('upsideDown', 1, 27, 123, 1, 0)
 
 	def upsideDownOff(self):
-		self.writeBytes(27, 123, 0, 0)
+		self.writeState('upsideDown', 0, 27, 123, 0, 0)
 
-	def sidewaysOn(self):     
-		self.writeBytes(27, 86, 1)
+	def sidewaysOn(self):
+		self.writeState('sideways', 1, 27, 86, 1)
 
-	def sidewaysOff(self): 
-		self.writeBytes(27, 86, 0)   
+	def sidewaysOff(self):
+		self.writeState('sideways', 0, 27, 86, 0)
 
 	def doubleHeightOn(self):
 		self.setPrintMode(self.DOUBLE_HEIGHT_MASK)
@@ -373,7 +896,7 @@ class Adafruit_Thermal(Serial):
 			pos = 2
 		else:
 			pos = 0
-		self.writeBytes(0x1B, 0x61, pos)
+		self.writeState('justify', pos, 0x1B, 0x61, pos)
 
 
 	# Feeds by the specified number of lines
@@ -388,7 +911,7 @@ class Adafruit_Thermal(Serial):
 	# Feeds by the specified number of individual pixel rows
 	def feedRows(self, rows):
 		self.writeBytes(27, 74, rows)
-		self.timeoutSet(rows * dotFeedTime)
+		self.timeoutSet(rows * self.dotFeedTime)
 
 
 	def flush(self):
@@ -410,7 +933,9 @@ class Adafruit_Thermal(Serial):
 			self.charHeight = 24
 			self.maxColumn  = 32
 
-		self.writeBytes(29, 33, size, 10)
+		with self.batch():
+			self.writeState('size', size, 29, 33, size)
+			self.writeBytes(10)
 		prevByte = '\n' # Setting the size adds a linefeed
 
 
@@ -419,7 +944,7 @@ class Adafruit_Thermal(Serial):
 	# 1 - normal underline
 	# 2 - thick underline
 	def underlineOn(self, weight=1):
-		self.writeBytes(27, 45, weight)
+		self.writeState('underline', weight, 27, 45, weight)
 
 
 	def underlineOff(self):
@@ -427,7 +952,7 @@ class Adafruit_Thermal(Serial):
 
 
 	def printBitmap(self, w, h, bitmap, LaaT=False):
-		rowBytes = (w + 7) / 8  # Round up to next byte boundary
+		rowBytes = (w + 7) // 8 # Round up to next byte boundary
 		if rowBytes >= 48:
 			rowBytesClipped = 48  # 384 pixels max width
 		else:
@@ -439,38 +964,271 @@ class Adafruit_Thermal(Serial):
 		# (no feed gaps) on large images...but has the
 		# opposite effect on small images that would fit
 		# in a single 'chunk', so use carefully!
-		if LaaT: maxChunkHeight = 1
-		else:    maxChunkHeight = 255
+		# With rasterBitmaps set (GS v 0, 16-bit height),
+		# chunks can be far taller than DC2 *'s 255 rows,
+		# so large images need few headers and feed gaps.
+		# Either way, the data is sent in paced blocks that
+		# fit the printer's buffer (see printBitmapRows()).
+		if LaaT:                 maxChunkHeight = 1
+		elif self.rasterBitmaps: maxChunkHeight = self.rasterMaxHeight
+		else:                    maxChunkHeight = 255
+
+		# Data is sent as slices of a memoryview over the bitmap,
+		# so nothing is copied: a whole chunk per write when rows
+		# fit the paper, else one write per (clipped) row.  Bitmaps
+		# given as lists (e.g. gfx/adalogo.py) are converted once.
+		if not isinstance(bitmap, (bytes, bytearray, memoryview)):
+			bitmap = bytearray(bitmap)
+		data = memoryview(bitmap)
+
+		# Runs of at least blankRowsMin all-white rows aren't sent
+		# at all; the paper is just fed past them (ESC J), which is
+		# both fewer bytes and faster than printing blank rows.
+		blank = bytearray(rowBytesClipped)
+		row   = 0
+		start = 0 # First row not yet printed
+		while row < h:
+			i = row * rowBytes
+			if data[i:i+rowBytesClipped] != blank:
+				row += 1
+				continue
+			end = row + 1
+			while end < h:
+				i = end * rowBytes
+				if data[i:i+rowBytesClipped] != blank:
+					break
+				end += 1
+			if end - row >= self.blankRowsMin:
+				self.printBitmapRows(bitmap, rowBytes,
+				  rowBytesClipped, start, row, maxChunkHeight)
+				n = end - row
+				while n > 0:
+					self.feedRows(min(n, 255))
+					n -= 255
+				start = end
+			row = end
+		self.printBitmapRows(bitmap, rowBytes, rowBytesClipped,
+		  start, h, maxChunkHeight)
+		if self.trimBitmaps:
+			self.setMargins(0, 384)
+
+		self.prevByte = '\n'
 
-		i = 0
-		for rowStart in range(0, h, maxChunkHeight):
-			chunkHeight = h - rowStart
+	# Prints rows 'first' up to (not including) 'last' of a bitmap.
+	#
+	# If trimBitmaps is set, each chunk is trimmed to the columns
+	# (bytes) actually containing ink: the left margin (GS L) is moved
+	# in to the first of them and only the occupied bytes of each row
+	# are sent, so narrow images cost a fraction of the full width.
+	# This is off by default since it relies on the firmware applying
+	# the left margin to bitmaps, which not all printers do.
+	def printBitmapRows(self, bitmap, rowBytes, rowBytesClipped,
+	  first, last, maxChunkHeight):
+		data = memoryview(bitmap)
+		i    = first * rowBytes
+		for rowStart in range(first, last, maxChunkHeight):
+			self.splitPoint()
+			chunkHeight = last - rowStart
 			if chunkHeight > maxChunkHeight:
 				chunkHeight = maxChunkHeight
 
-			# Timeout wait happens here
-			self.writeBytes(18, 42, chunkHeight, rowBytesClipped)
-
-			for y in range(chunkHeight):
-				for x in range(rowBytesClipped):
-					super(Adafruit_Thermal, self).write(
-					  chr(bitmap[i]))
-					i += 1
-				i += rowBytes - rowBytesClipped
-			self.timeoutSet(chunkHeight * self.dotPrintTime)
+			left  = 0
+			width = rowBytesClipped
+			if self.trimBitmaps:
+				left, width = self.inkColumns(bitmap, i,
+				  chunkHeight, rowBytes, rowBytesClipped)
+				# Not worth the margin commands if only a
+				# few bytes would be saved
+				if (rowBytesClipped - width) * chunkHeight <= 8:
+					left  = 0
+					width = rowBytesClipped
+				self.setMargins(left * 8, width * 8)
 
-		self.prevByte = '\n'
+			# Timeout wait happens here
+			if self.rasterBitmaps:
+				header = (29, 118, 48, 0, width, 0,
+				  chunkHeight & 0xFF, chunkHeight >> 8)
+			else:
+				header = (18, 42, chunkHeight, width)
+			self.writeBytes(*header)
+			self.sendCommands()
+
+			# The chunk's data goes out in blocks of up to half
+			# the printer's buffer, so a link faster than the
+			# print head can't overrun it.  Whichever is slower,
+			# the print head or the serial link, sets the pace
+			# of each.  The timeout runs from before the data is
+			# written, since a real port's write() blocks until
+			# most of it is out.
+			blockRows = max(1, (self.bufferSize // 2) // width)
+			extra     = len(header)
+			for y in range(0, chunkHeight, blockRows):
+				rows = min(blockRows, chunkHeight - y)
+				if y:
+					self.timeoutWait()
+				self.timeoutSet(max(rows * self.dotPrintTime,
+				  (rows * width + extra) * self.byteTime))
+				extra = 0
+				if width == rowBytes:
+					n = rows * rowBytes
+					self.sendRaw(data[i:i+n])
+					i += n
+				else:
+					for row in range(rows):
+						self.sendRaw(data[i+left:i+left+width])
+						i += rowBytes
+
+	# Finds the horizontal extent of ink in a chunk of bitmap rows
+	# starting at offset i.  Returns (first column, width) in bytes.
+	def inkColumns(self, bitmap, i, rows, rowBytes, rowBytesClipped):
+		end   = i + rows * rowBytes
+		blank = bytearray(rows)
+		cols  = [ c for c in range(rowBytesClipped)
+		          if bitmap[i+c:end:rowBytes] != blank ]
+		if not cols:
+			return 0, rowBytesClipped
+		return cols[0], cols[-1] - cols[0] + 1
+
+	# Sets left margin (GS L) and print area width (GS W), in dots.
+	def setMargins(self, left, width):
+		with self.batch():
+			self.writeState('leftMargin', left,
+			  29, 76, left & 0xFF, left >> 8)
+			self.writeState('printWidth', width,
+			  29, 87, width & 0xFF, width >> 8)
 
 	# Print Image.  Requires Python Imaging Library.  This is
 	# specific to the Python port and not present in the Arduino
 	# library.  Image will be cropped to 384 pixels width if
 	# necessary, and converted to 1-bit w/diffusion dithering.
-	# For any other behavior (scale, B&W threshold, etc.), use
-	# the Imaging Library to perform such operations before
-	# passing the result to this function.
-	def printImage(self, image, LaaT=False):
-		import Image
+	# Pass dither='threshold', 'bayer', 'atkinson' or 'floyd' to
+	# use one of the methods in dithering.py instead (with tone
+	# adjustment for thermal paper).  For any other behavior
+	# (scale, etc.), use the Imaging Library to perform such
+	# operations before passing the result to this function.
+	def printImage(self, image, LaaT=False, dither=None):
+		width, height, bitmap = self.imageBitmap(image, dither)
+		self.printBitmap(width, height, bitmap, LaaT)
 
+	# Packed (width, height, bitmap) for an Image, by way of the
+	# bitmap cache if there is one.
+	def imageBitmap(self, image, dither=None):
+		convert = self.rasterize
+		if dither is not None:
+			import dithering
+			# Crop first so no time is spent dithering what's cut off
+			convert = lambda image: self.rasterize(dithering.dither(
+			  image.crop((0, 0, min(image.size[0], 384), image.size[1])),
+			  dither))
+		if self.bitmapCache is not None:
+			return self.bitmapCache.rasterize(image, convert, dither or '')
+		return convert(image)
+
+	# Print an Image that recurs often (a logo, the face printed after
+	# every action).  With a LogoRegistry (see logos.py, and the 'logos'
+	# argument) the image is stored in the printer's non-volatile
+	# memory the first time and afterward printed with a four-byte
+	# command rather than sent in full.  Without one, or if the image
+	# can't be stored, this is the same as printImage().
+	def printLogo(self, image, LaaT=False, dither=None):
+		width, height, bitmap = self.imageBitmap(image, dither)
+		n = None
+		if self.logoRegistry is not None:
+			n = self.logoRegistry.slot(self, width, height, bitmap)
+		if n is None:
+			self.printBitmap(width, height, bitmap, LaaT)
+		else:
+			self.printNVImage(n, height)
+
+	# Converts a packed bitmap (as for printBitmap()) to the column
+	# format used by FS q and GS *: each byte is 8 vertical dots, MSB
+	# at top, running down each column in turn.  Width and height are
+	# padded to multiples of 8.  Returns (x, y, data), with x and y the
+	# width and height in units of 8 dots.
+	def columnBitmap(self, w, h, bitmap):
+		rowBytes = (w + 7) // 8
+		x        = rowBytes
+		y        = (h + 7) // 8
+		rows     = bytearray(bitmap[:rowBytes * h])
+		rows    += bytearray(rowBytes * (y * 8 - h)) # Pad to whole bands
+		data     = bytearray(x * 8 * y)
+		for band in range(y):
+			base = band * 8 * rowBytes
+			for c in range(rowBytes):
+				r = rows[base+c:base+c+8*rowBytes:rowBytes]
+				if not any(r):
+					continue
+				for bit in range(8):
+					m = 0x80 >> bit
+					v = 0
+					for k in range(8):
+						if r[k] & m:
+							v |= 0x80 >> k
+					data[(c * 8 + bit) * y + band] = v
+		return x, y, data
+
+	# Stores bitmaps (a list of (width, height, bitmap) tuples) in the
+	# printer's non-volatile memory as images 1, 2, ...  This replaces
+	# all images previously stored, and the flash memory has a limited
+	# number of write cycles, so keep it to when images change (which
+	# LogoRegistry does).
+	def defineNVImages(self, bitmaps):
+		self.writeBytes(28, 113, len(bitmaps))
+		total = 3
+		for w, h, bitmap in bitmaps:
+			x, y, data = self.columnBitmap(w, h, bitmap)
+			self.writeBytes(x & 0xFF, x >> 8, y & 0xFF, y >> 8)
+			self.sendCommands()
+			self.sendRaw(data)
+			total += 4 + len(data)
+		self.timeoutSet(total * self.byteTime + self.nvWriteTime)
+		# Some firmware reinitializes after storing
+		self.invalidateState()
+		self.prevByte = '\n'
+
+	# Prints stored NV image n (1-based).  Mode 0 is normal size, 1
+	# double width, 2 double height, 3 both.  'height' (in dots, before
+	# doubling) is used for timing only.
+	def printNVImage(self, n, height=0, mode=0):
+		self.writeBytes(28, 112, n, mode)
+		if mode & 2:
+			height *= 2
+		self.timeoutSet(height * self.dotPrintTime)
+		self.prevByte = '\n'
+
+	# Stores a bitmap in the printer's RAM (GS *) for printing with
+	# printDefinedImage().  Only one image fits, it must be no more
+	# than 1536 bytes in column format (e.g. 384x32), and it's lost
+	# when the printer is switched off; NV images suit larger ones.
+	def defineImage(self, w, h, bitmap):
+		x, y, data = self.columnBitmap(w, h, bitmap)
+		if x * y > 1536:
+			raise ValueError('Image too large for downloaded memory')
+		self.writeBytes(29, 42, x, y)
+		self.sendCommands()
+		self.sendRaw(data)
+		self.timeoutSet((4 + len(data)) * self.byteTime)
+		self.definedHeight = y * 8
+
+	# Prints the image stored by defineImage() (mode as above).
+	def printDefinedImage(self, mode=0):
+		self.writeBytes(29, 47, mode)
+		height = self.definedHeight
+		if mode & 2:
+			height *= 2
+		self.timeoutSet(height * self.dotPrintTime)
+		self.prevByte = '\n'
+
+	# Byte translation table inverting all 8 bits.
+	INVERT_TABLE = bytearray(255 - i for i in range(256))
+
+	# Convert an Image to the packed 1-bit format used by printBitmap()
+	# (black = 1, MSB first, rows padded to whole bytes, max 384 pixels
+	# wide).  Returns a (width, height, bitmap) tuple.  Rather than
+	# visiting each pixel in Python, the Imaging Library packs the rows
+	# itself (its '1' raw format is MSB-first with white = 1), leaving
+	# only an inversion by table lookup and clearing of the row padding.
+	def rasterize(self, image):
 		if image.mode != '1':
 			image = image.convert('1')
 
@@ -478,36 +1236,35 @@ class Adafruit_Thermal(Serial):
 		height = image.size[1]
 		if width > 384:
 			width = 384
-		rowBytes = (width + 7) / 8
-		bitmap   = bytearray(rowBytes * height)
-		pixels   = image.load()
-
-		for y in range(height):
-			n = y * rowBytes
-			x = 0
-			for b in range(rowBytes):
-				sum = 0
-				bit = 128
-				while bit > 0:
-					if x >= width: break
-					if pixels[x, y] == 0:
-						sum |= bit
-					x    += 1
-					bit >>= 1
-				bitmap[n + b] = sum
+			image = image.crop((0, 0, width, height))
+		rowBytes = (width + 7) // 8
 
-		self.printBitmap(width, height, bitmap, LaaT)
+		if hasattr(image, 'tobytes'):
+			data = image.tobytes()
+		else:
+			data = image.tostring() # Older PIL
+		bitmap = bytearray(data).translate(self.INVERT_TABLE)
+
+		# Pad bits beyond the image width came out as 1 after
+		# inversion; clear them in the last byte of each row.
+		if width & 7:
+			mask  = (0xFF << (8 - (width & 7))) & 0xFF
+			table = bytearray(i & mask for i in range(256))
+			bitmap[rowBytes-1::rowBytes] = (
+			  bitmap[rowBytes-1::rowBytes].translate(table))
+
+		return width, height, bitmap
 
 
 	# Take the printer offline. Print commands sent after this
 	# will be ignored until 'online' is called.
 	def offline(self):
-		self.writeBytes(27, 61, 0)
+		self.writeState('online', 0, 27, 61, 0)
 
 
 	# Take the printer online. Subsequent print commands will be obeyed.
 	def online(self):
-		self.writeBytes(27, 61, 1)
+		self.writeState('online', 1, 27, 61, 1)
 
 
 	# Put the printer into a low-energy state immediately.
@@ -526,7 +1283,7 @@ class Adafruit_Thermal(Serial):
 		self.writeBytes(255)
 		for i in range(10):
 			self.writeBytes(27)
-			self.timeoutSet(0.1)
+			self.timeoutDelay(0.1)
 
 
 	# Empty method, included for compatibility
@@ -535,13 +1292,85 @@ class Adafruit_Thermal(Serial):
 		pass
 
 
+	# Changes the serial rate used to talk to the printer, and the
+	# pacing derived from it.  At 9600 baud large bitmaps are limited
+	# by the serial link rather than the print head; faster rates
+	# remove that bottleneck.  The printer's own rate is normally set
+	# on the unit itself (see its self-test printout).  For firmware
+	# that accepts a rate-change command, pass its bytes as 'command'
+	# and they're sent at the old rate before switching over.
+	def setBaudrate(self, rate, command=None):
+		if command:
+			self.writeBytes(*command)
+			self.timeoutWait()
+			if self.transport is None:
+				Serial.flush(self) # Let it drain at the old rate
+		self.baudrate = rate
+		self.byteTime = 11.0 / float(rate)
+
+	# Finds the rate the printer is set to by sending a status query
+	# at each candidate rate, keeping the first one that gets the same
+	# reply twice.  At the wrong rate the query arrives as garbage and
+	# goes unanswered (though the printer may print a few junk
+	# characters).  Returns the rate found, or None if the printer
+	# didn't answer at any (the original rate is then restored).
+	def probeBaudrate(self, rates=None):
+		if self.transport is not None:
+			return self.baudrate
+		original = self.baudrate
+		timeout  = self.timeout
+		self.timeout = 0.25
+		try:
+			for rate in rates or self.baudRates:
+				self.setBaudrate(rate)
+				replies = []
+				for i in range(2):
+					self.timeoutWait()
+					self.flushInput()
+					self.sendRaw(bytearray([27, 118, 0]))
+					replies.append(self.readRaw(1))
+				if replies[0] and replies[0] == replies[1]:
+					return rate
+			self.setBaudrate(original)
+			return None
+		finally:
+			self.timeout = timeout
+
+	# Firmware with the full ESC/POS command set, including the GS v 0
+	# raster bitmap command, answers the GS I 65 firmware version
+	# query with '_', the version and a NUL; older firmware (DC2 *
+	# bitmaps only) ignores it.  Sets rasterBitmaps accordingly and
+	# returns the version reported, or None if there was no answer.
+	def probeRaster(self):
+		timeout = self.timeout
+		self.timeout = 0.25
+		try:
+			if self.transport is None:
+				self.flushInput()
+			self.writeBytes(29, 73, 65)
+			self.sendCommands()
+			reply = bytearray()
+			while len(reply) < 32:
+				b = self.readRaw(1)
+				if not b or b == b'\0':
+					break
+				reply += bytearray(b)
+		finally:
+			self.timeout = timeout
+		self.rasterBitmaps = reply[:1] == b'_'
+		if not self.rasterBitmaps:
+			return None
+		return reply[1:].decode('latin-1')
+
+
 	# Check the status of the paper using the printers self reporting
 	# ability. Doesn't match the datasheet...
 	# Returns True for paper, False for no paper.
 	def hasPaper(self):
 		self.writeBytes(27, 118, 0)
+		self.sendCommands()
 		# Bit 2 of response seems to be paper status
-		stat = ord(self.read(1)) & 0b00000100
+		stat = ord(self.readRaw(1)) & 0b00000100
 		# If set, we have paper; if clear, no paper
 		return stat == 0
 
@@ -555,7 +1384,7 @@ class Adafruit_Thermal(Serial):
 		# height when setting line height, making this more akin
 		# to inter-line spacing.  Default line spacing is 32
 		# (char height of 24, line spacing of 8).
-		self.writeBytes(27, 51, val)
+		self.writeState('lineHeight', val, 27, 51, val)
 
 
 	# Copied from Arduino lib for parity; is marked 'not working' there
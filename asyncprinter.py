@@ -0,0 +1,118 @@
+# asyncio counterpart to Adafruit_Thermal (Python 3.5+).
+#
+# Every printing method of Adafruit_Thermal is available here as a
+# coroutine, so printing can share one event loop with a web server
+# (Tornado runs on asyncio), GPIO handling and so on, with no threads
+# and no busy-waiting:
+#
+#   printer = AsyncThermalPrinter('/dev/ttyAMA0', 9600)
+#   await printer.begin()
+#   await printer.println('Hello!')
+#   await printer.printImage(Image.open('gfx/hello.png'), True)
+#
+# Each call is compiled into a PrintJob (see printjob.py) by an
+# Adafruit_Thermal instance used only for layout, then streamed to the
+# port with non-blocking writes; waits between checkpoints are
+# asyncio.sleep()s.  Calls are printed in the order they were made.
+
+import asyncio, os
+from serial import Serial
+from Adafruit_Thermal import Adafruit_Thermal
+from printjob import JobRecorder, compileJob, printMethods
+
+class AsyncThermalPrinter(object):
+
+	def __init__(self, port='/dev/ttyAMA0', baudrate=9600, **kwargs):
+		self.serial = Serial(port, baudrate)
+		self.fd     = self.serial.fileno()
+		os.set_blocking(self.fd, False)
+
+		# The layout printer's initialization (wake, reset, heat
+		# settings) is recorded here and sent by begin().
+		recorder     = JobRecorder()
+		profile      = kwargs.pop('profile', Adafruit_Thermal.profilePath)
+		self.printer = Adafruit_Thermal(None, baudrate,
+		  transport=recorder, profile=None, **kwargs)
+		if profile:
+			self.printer.loadProfile(profile, port)
+		self.initJob    = recorder.job
+		self.lock       = asyncio.Lock()
+		self.resumeTime = 0.0 # Event loop time when printer is idle
+
+	# Sends the printer initialization; await this before printing.
+	async def begin(self):
+		await self.sendJob(self.initJob)
+
+	# Compiles printer.<name>(*args, **kwargs) and prints the result.
+	async def run(self, name, *args, **kwargs):
+		async with self.lock:
+			job = compileJob(self.printer,
+			  getattr(self.printer, name), *args, **kwargs)
+			await self.stream(job)
+
+	async def sendJob(self, job):
+		async with self.lock:
+			await self.stream(job)
+
+	async def stream(self, job):
+		loop = asyncio.get_event_loop()
+		await asyncio.sleep(max(0, self.resumeTime - loop.time()))
+		start = loop.time()
+		data  = memoryview(job.data)
+		pos   = 0
+		for offset, t in job.checkpoints:
+			if offset > pos:
+				await self.writeAll(data[pos:offset])
+				pos = offset
+			await asyncio.sleep(max(0, start + t - loop.time()))
+		await self.writeAll(data[pos:])
+		self.resumeTime = start + job.duration
+
+	async def writeAll(self, data):
+		while len(data):
+			try:
+				data = data[os.write(self.fd, data):]
+			except BlockingIOError:
+				await self.ready(asyncio.get_event_loop().add_writer,
+				  asyncio.get_event_loop().remove_writer)
+
+	# Waits for the port to become writable (or readable).
+	async def ready(self, add, remove):
+		future = asyncio.get_event_loop().create_future()
+		add(self.fd, future.set_result, None)
+		try:
+			await future
+		finally:
+			remove(self.fd)
+
+	async def hasPaper(self):
+		async with self.lock:
+			job = compileJob(self.printer,
+			  self.printer.writeBytes, 27, 118, 0)
+			await self.stream(job)
+			loop = asyncio.get_event_loop()
+			while True:
+				try:
+					stat = os.read(self.fd, 1)
+				except BlockingIOError:
+					stat = b''
+				if stat:
+					return (stat[0] & 0b00000100) == 0
+				await asyncio.wait_for(self.ready(
+				  loop.add_reader, loop.remove_reader),
+				  self.serial.timeout or 5)
+
+	def close(self):
+		self.serial.close()
+
+
+# Coroutine wrappers for the Adafruit_Thermal printing methods.
+def printMethod(name):
+	async def method(self, *args, **kwargs):
+		await self.run(name, *args, **kwargs)
+	method.__name__ = name
+	method.__doc__  = 'Coroutine version of Adafruit_Thermal.%s()' % name
+	return method
+
+for name in printMethods:
+	setattr(AsyncThermalPrinter, name, printMethod(name))
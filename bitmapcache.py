@@ -0,0 +1,123 @@
+# Disk cache of printer-ready bitmaps for Adafruit_Thermal.printImage().
+#
+# Images that are printed over and over (the face after every action,
+# hello/goodbye art) would otherwise be decoded, dithered and packed
+# from scratch each time.  Pass a BitmapCache to Adafruit_Thermal (the
+# 'cache' argument) and printImage() will look for the packed bitmap
+# here first.
+#
+# Only images opened straight from a file (Image.open()) and not yet
+# loaded are cached.  The Imaging Library keeps an image's filename
+# through in-place edits (paste(), ImageDraw, etc.), but those load the
+# pixel data first, so an image whose data is still unread can't have
+# been changed.  Anything else, including an image already loaded
+# (e.g. printed once before), is converted as usual.
+#
+# Entries are keyed by a hash of the file's contents, which is only
+# recomputed when the file's modification time or size change (the
+# stale entry is dropped at that point).  Once the cache grows past
+# maxBytes, least recently used entries are deleted.
+
+import hashlib, os, struct
+
+class BitmapCache(object):
+
+	MAGIC  = b'ATBM'
+	HEADER = struct.Struct('<4sHHH') # Magic, width, height, rowBytes
+
+	def __init__(self, path='~/.cache/Adafruit_Thermal', maxBytes=4000000):
+		self.path     = os.path.expanduser(path)
+		self.maxBytes = maxBytes
+		self.digests  = {} # filename: ((mtime, size), content hash)
+		if not os.path.isdir(self.path):
+			os.makedirs(self.path)
+
+	# Returns (width, height, bitmap) for image, from the cache if
+	# possible, else by calling convert(image) and storing the result.
+	# 'variant' distinguishes different conversions of the same file.
+	def rasterize(self, image, convert, variant=''):
+		filename = getattr(image, 'filename', None)
+		if (not filename or not getattr(image, 'tile', None) or
+		  not os.path.isfile(filename)):
+			return convert(image)
+
+		entry = self.entryPath(filename, variant)
+		try:
+			with open(entry, 'rb') as f:
+				data = f.read()
+			magic, width, height, rowBytes = (
+			  self.HEADER.unpack_from(data))
+			if (magic == self.MAGIC and len(data) ==
+			  self.HEADER.size + rowBytes * height):
+				os.utime(entry, None) # Mark recently used
+				return (width, height,
+				  bytearray(data[self.HEADER.size:]))
+		except (IOError, OSError, struct.error):
+			pass
+
+		width, height, bitmap = convert(image)
+		self.store(entry, width, height, bitmap)
+		return width, height, bitmap
+
+	# Cache file name for a source file.  The source is re-hashed only
+	# if its mtime or size changed, in which case the old entry is
+	# removed.
+	def entryPath(self, filename, variant):
+		st    = os.stat(filename)
+		stamp = (st.st_mtime, st.st_size)
+		known = self.digests.get(filename)
+		if known and known[0] == stamp:
+			digest = known[1]
+		else:
+			with open(filename, 'rb') as f:
+				digest = hashlib.sha1(f.read()).hexdigest()
+			if known and known[1] != digest:
+				self.remove(known[1])
+			self.digests[filename] = (stamp, digest)
+		return os.path.join(self.path,
+		  digest + (variant and '-' + variant) + '.bin')
+
+	def store(self, entry, width, height, bitmap):
+		rowBytes = (width + 7) // 8
+		tmp      = entry + '.tmp'
+		try:
+			with open(tmp, 'wb') as f:
+				f.write(self.HEADER.pack(
+				  self.MAGIC, width, height, rowBytes))
+				f.write(bitmap)
+			os.rename(tmp, entry) # Readers never see partial files
+		except (IOError, OSError):
+			return
+		self.evict()
+
+	# Deletes all entries (any variant) for a content hash.
+	def remove(self, digest):
+		for name in os.listdir(self.path):
+			if name.startswith(digest):
+				try:
+					os.remove(os.path.join(self.path, name))
+				except OSError:
+					pass
+
+	# Deletes least recently used entries until under maxBytes.
+	def evict(self):
+		entries = []
+		total   = 0
+		for name in os.listdir(self.path):
+			if not name.endswith('.bin'):
+				continue
+			try:
+				st = os.stat(os.path.join(self.path, name))
+			except OSError:
+				continue
+			entries.append((st.st_mtime, st.st_size, name))
+			total += st.st_size
+		entries.sort()
+		for mtime, size, name in entries:
+			if total <= self.maxBytes:
+				break
+			try:
+				os.remove(os.path.join(self.path, name))
+				total -= size
+			except OSError:
+				pass
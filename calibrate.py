@@ -19,12 +19,68 @@
 # You may need to pull on the paper as it reaches the jamming point,
 # and/or just abort the program, press the feed button and take the
 # last good number.
+#
+# Run as 'calibrate.py times' (after settling on a heat time) to instead
+# measure this unit's print and feed speed.  A series of bars and paper
+# feeds of increasing length is issued, each followed by a status query;
+# the printer only answers once it has worked through everything before
+# the query, so the reply marks when the job physically finished.  A
+# line fit through the results gives the time per dot row for printing
+# and feeding, which is saved to the printer's profile file and used by
+# Adafruit_Thermal from then on (see loadProfile()).
 
 from __future__ import print_function
 from Adafruit_Thermal import *
+import sys, time
 
 printer = Adafruit_Thermal("/dev/ttyAMA0", 9600, timeout=5)
 
+barBytes  = 6                    # Narrow bars so 9600 baud keeps up
+rowCounts = [ 48, 96, 144, 192 ] # Bar heights/feed lengths to time
+margin    = 1.1                  # Safety factor applied to results
+
+# Times a printing job, from first byte out to the status reply.
+def timeJob(job, *args):
+	printer.setTimes(0, 0) # Issue everything without waiting
+	printer.flushInput()
+	start = time.time()
+	job(*args)
+	printer.writeBytes(27, 118, 0) # Status query
+	if len(printer.read(1)) == 0:
+		sys.exit('No reply from printer; cannot time it.')
+	return time.time() - start
+
+# Least-squares slope of ys against xs.
+def slope(xs, ys):
+	n  = float(len(xs))
+	mx = sum(xs) / n
+	my = sum(ys) / n
+	return (sum((x - mx) * (y - my) for x, y in zip(xs, ys)) /
+	        sum((x - mx) ** 2 for x in xs))
+
+def bar(rows):
+	printer.printBitmap(barBytes * 8, rows,
+	  bytearray([0xFF]) * (barBytes * rows))
+
+if len(sys.argv) > 1 and sys.argv[1] == 'times':
+	printTimes = [ timeJob(bar, n) for n in rowCounts ]
+	feedTimes  = [ timeJob(printer.feedRows, n) for n in rowCounts ]
+
+	# The bars are narrow enough that the mechanism, not the serial
+	# link, sets their pace (sending overlaps printing), so the slope
+	# is the print time per row as it stands.  The driver likewise
+	# takes the slower of the two for bitmaps rather than their sum.
+	dotPrint = slope(rowCounts, printTimes) * margin
+	dotFeed  = slope(rowCounts, feedTimes) * margin
+
+	printer.setTimes(dotPrint * 1000000.0, dotFeed * 1000000.0)
+	printer.saveProfile()
+
+	printer.println('Print time: %d uS/row' % (dotPrint * 1000000.0))
+	printer.println('Feed time:  %d uS/row' % (dotFeed  * 1000000.0))
+	printer.feed(4)
+	sys.exit(0)
+
 for i in range(0,256,15):
 	printer.begin(i)
 	printer.println(i)                 # Print heat time
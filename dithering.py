@@ -0,0 +1,125 @@
+# Dithering for Adafruit_Thermal.printImage().
+#
+# printImage() normally leaves conversion to 1 bit to the Imaging
+# Library's convert('1') (Floyd-Steinberg error diffusion).  This module
+# offers a choice of methods, selected by name:
+#
+#   printer.printImage(photo, dither='bayer')
+#
+#   'threshold'  Plain black/white cutoff.  Best for line art and text.
+#   'bayer'      Ordered dither with a Bayer matrix.  Regular pattern,
+#                holds up well to the thermal head's dot gain.
+#   'atkinson'   Error diffusion passing on only 3/4 of the error;
+#                crisp with good highlight/shadow detail.
+#   'floyd'      Floyd-Steinberg error diffusion (the Imaging Library's
+#                own).
+#
+# Threshold and Bayer dithering are done entirely by Imaging Library
+# operations on the whole image, so a 384-pixel-wide photo takes
+# milliseconds.  Floyd-Steinberg is native code too.  Atkinson, like any
+# error diffusion, must visit pixels in order and runs in Python; expect
+# around a second for a large photo on a Pi.
+#
+# Before dithering, images are converted to grayscale and passed through
+# a lookup table for gamma and contrast.  Thermal paper darkens
+# midtones (each dot bleeds a little), so the defaults lighten them
+# slightly; pass gamma=1.0, contrast=1.0 to leave the image unchanged.
+
+try:
+	from PIL import Image, ImageChops
+except ImportError: # Older PIL
+	import Image, ImageChops
+
+# Image.frombytes() was Image.fromstring() in older PIL
+frombytes = getattr(Image, 'frombytes', None) or Image.fromstring
+
+THERMAL_GAMMA    = 1.6
+THERMAL_CONTRAST = 1.1
+
+# Lookup table applying gamma (>1 lightens midtones) and contrast
+# (>1 increases, around mid-gray).
+def toneTable(gamma=THERMAL_GAMMA, contrast=THERMAL_CONTRAST):
+	table = []
+	for i in range(256):
+		v = 255.0 * (i / 255.0) ** (1.0 / gamma)
+		v = (v - 128.0) * contrast + 128.0
+		table.append(min(255, max(0, int(v + 0.5))))
+	return table
+
+def grayscale(image, gamma=THERMAL_GAMMA, contrast=THERMAL_CONTRAST):
+	if image.mode != 'L':
+		image = image.convert('L')
+	if gamma != 1.0 or contrast != 1.0:
+		image = image.point(toneTable(gamma, contrast))
+	return image
+
+def threshold(image, level=128):
+	return image.point([ 255 if i >= level else 0 for i in range(256) ],
+	  '1')
+
+# Bayer threshold matrix of size n x n (n a power of 2), as a list of
+# rows of values 0 to n*n-1.
+def bayerMatrix(n):
+	m = [ [ 0 ] ]
+	while len(m) < n:
+		m =([ [ 4 * v     for v in row ] + [ 4 * v + 2 for v in row ]
+		       for row in m ] +
+		     [ [ 4 * v + 3 for v in row ] + [ 4 * v + 1 for v in row ]
+		       for row in m ])
+	return m
+
+def bayer(image, size=4):
+	w, h   = image.size
+	matrix = bayerMatrix(size)
+	n      = len(matrix)
+	# Tile the threshold map over the image, built directly as bytes
+	reps   = (w + n - 1) // n
+	rows   = [ (bytearray(int((v + 0.5) * 256 / (n * n)) for v in row) *
+	            reps)[:w] for row in matrix ]
+	tile   = b''.join(bytes(r) for r in rows)
+	data   = (tile * ((h + n - 1) // n))[:w * h]
+	tmap   = frombytes('L', (w, h), data)
+	# Pixels brighter than their threshold become white
+	diff   = ImageChops.subtract(image, tmap)
+	return diff.point([ 255 if i else 0 for i in range(256) ], '1')
+
+def atkinson(image):
+	w, h = image.size
+	px   = list(image.getdata())
+	out  = bytearray(w * h)
+	for y in range(h):
+		row = y * w
+		for x in range(w):
+			i   = row + x
+			old = px[i]
+			if old >= 128:
+				out[i] = 255
+				err    = (old - 255) >> 3
+			else:
+				err    = old >> 3
+			if err:
+				if x + 1 < w:
+					px[i + 1] += err
+					if x + 2 < w: px[i + 2] += err
+				if y + 1 < h:
+					j = i + w
+					px[j] += err
+					if x > 0:     px[j - 1] += err
+					if x + 1 < w: px[j + 1] += err
+					if y + 2 < h: px[j + w] += err
+	return frombytes('L', (w, h), bytes(out)).convert('1')
+
+def floyd(image):
+	return image.convert('1')
+
+METHODS = { 'threshold': threshold,
+            'bayer'    : bayer,
+            'atkinson' : atkinson,
+            'floyd'    : floyd }
+
+# Converts image to 1 bit using the named method.
+def dither(image, method='floyd', gamma=THERMAL_GAMMA,
+  contrast=THERMAL_CONTRAST):
+	if method not in METHODS:
+		raise ValueError('Unknown dither method: %s' % method)
+	return METHODS[method](grayscale(image, gamma, contrast))
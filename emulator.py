@@ -0,0 +1,329 @@
+# Virtual-clock emulator of the thermal printer, for benchmarking and
+# testing Adafruit_Thermal without any hardware attached:
+#
+#   from Adafruit_Thermal import *
+#   from emulator import PrinterEmulator
+#
+#   emu     = PrinterEmulator()
+#   printer = Adafruit_Thermal(transport=emu, profile=None)
+#   printer.println('Hello!')
+#   print(emu.report())
+#
+# The emulator stands in for the serial port (see the 'transport'
+# argument to Adafruit_Thermal).  It also supplies the clock used for
+# pacing, so the driver's waits advance virtual time instantly rather
+# than actually sleeping; a long job "prints" in milliseconds.
+#
+# Incoming bytes are delivered at the serial line rate into a receive
+# buffer of bufferSize bytes and parsed as ESC/POS commands.  Text lines,
+# bitmap rows, feeds and barcodes are handed to a modeled print
+# mechanism that works through them one at a time, taking dotPrintTime
+# per printed dot row and dotFeedTime per fed row (these are the
+# emulated unit's "true" speeds, independent of whatever estimates the
+# driver is using).  Bytes leave the buffer once the work they describe
+# is done.
+#
+# report() then gives:
+#   bytes        - total bytes received
+#   overruns     - bytes that arrived while the buffer was full (on a
+#                  real printer, these would be lost)
+#   idleGaps     - times the mechanism stopped mid-job for want of data
+#   idleTime     - total duration of those gaps
+#   jobTime      - first byte received to mechanism finished
+#   hostTime     - virtual time spent by the host (including waits)
+
+from collections import deque
+
+ESC = 27
+GS  = 29
+DC2 = 18
+FS  = 28
+DLE = 16
+
+# Number of argument bytes following simple (fixed-length) commands
+ESC_ARGS = { 32: 1, 33: 1, 45: 1, 51: 1, 55: 3, 56: 1, 61: 1, 64: 0,
+             74: 1, 76: 0, 86: 1, 97: 1, 100: 1, 118: 1, 123: 1 }
+GS_ARGS  = { 33: 1, 47: 1, 58: 0, 72: 1, 73: 1, 76: 2, 87: 2, 97: 1,
+             104: 1, 119: 1 }
+DC2_ARGS = { 35: 1, 84: 0 }
+FS_ARGS  = { 112: 2 }
+DLE_ARGS = { 4: 1 }
+
+class PrinterEmulator(object):
+
+	# 'firmware' is the version reported to a GS I 65 query, or None
+	# to emulate older firmware that ignores it.
+	def __init__(self, baudrate=9600, bufferSize=4096,
+	  dotPrintTime=0.03, dotFeedTime=0.0021, firmware=None):
+		self.byteTime     = 11.0 / float(baudrate)
+		self.bufferSize   = bufferSize
+		self.dotPrintTime = dotPrintTime
+		self.dotFeedTime  = dotFeedTime
+		self.firmware     = firmware
+		self.now          = 0.0 # Host's virtual clock
+		self.linkFree     = 0.0 # When the serial line is next idle
+		self.mechFree     = 0.0 # When the mechanism is next idle
+		self.pending      = deque() # (end time, bytes) of queued work
+		self.queued       = 0       # Bytes in 'pending'
+		self.held         = 0       # Bytes received, not yet queued
+		self.responses    = deque() # (time, byte) replies to host
+		self.nvHeights    = []      # Heights of stored NV images
+		self.ramHeight    = 0       # Height of downloaded image
+		self.bytes        = 0
+		self.overruns     = 0
+		self.idleGaps     = 0
+		self.idleTime     = 0.0
+		self.firstByte    = None
+		self.cmd          = bytearray() # Command being received
+		self.rasterRows   = 0 # Remaining rows of bitmap data
+		self.rasterBytes  = 0 # Bytes per bitmap row
+		self.rowFill      = 0 # Bytes received of current row
+		self.reset()
+
+	# Printer state following power-up or ESC @.
+	def reset(self):
+		self.printMode     = 0
+		self.sizeMode      = 0
+		self.lineHeight    = 32
+		self.barcodeHeight = 50
+		self.column        = 0
+		self.wrapped       = False
+		self.setCharSize()
+
+	def setCharSize(self):
+		h = (self.sizeMode & 0x0F) + 1
+		w = (self.sizeMode >> 4) + 1
+		if self.printMode & (1 << 4): h *= 2
+		if self.printMode & (1 << 5): w *= 2
+		self.charHeight = 24 * h
+		self.maxColumn  = 32 // w
+
+
+	# Transport interface used by Adafruit_Thermal.
+
+	def clock(self):
+		return self.now
+
+	def sleep(self, seconds):
+		if seconds > 0:
+			self.now += seconds
+
+	def write(self, data):
+		if isinstance(data, type(u'')):
+			data = data.encode('latin-1')
+		for b in bytearray(data):
+			t = max(self.now, self.linkFree) + self.byteTime
+			self.linkFree = t
+			self.receive(b, t)
+		return len(data)
+
+	# Returns a status reply if one has been produced, advancing the
+	# host's clock to when it would have arrived.
+	def read(self, size=1):
+		out = bytearray()
+		while self.responses and len(out) < size:
+			t, b = self.responses.popleft()
+			self.now = max(self.now, t)
+			out.append(b)
+		return bytes(out)
+
+	def report(self):
+		if self.firstByte is None:
+			jobTime = 0.0
+		else:
+			jobTime = max(self.mechFree, self.linkFree) - self.firstByte
+		return { 'bytes'    : self.bytes,
+		         'overruns' : self.overruns,
+		         'idleGaps' : self.idleGaps,
+		         'idleTime' : self.idleTime,
+		         'jobTime'  : jobTime,
+		         'hostTime' : self.now }
+
+
+	# Buffer and mechanism model.
+
+	# A byte arrives in the printer's buffer at time t.
+	def receive(self, b, t):
+		self.bytes += 1
+		if self.firstByte is None:
+			self.firstByte = t
+		while self.pending and self.pending[0][0] <= t:
+			self.queued -= self.pending.popleft()[1]
+		if self.queued + self.held >= self.bufferSize:
+			self.overruns += 1
+			return
+		self.held += 1
+		self.parse(b, t)
+
+	# Queues work for the mechanism, covering all held bytes; it
+	# can start once the last of them has arrived (time t).
+	def work(self, t, duration):
+		start = max(t, self.mechFree)
+		if duration > 0 and self.firstByte < self.mechFree < t:
+			self.idleGaps += 1
+			self.idleTime += t - self.mechFree
+		self.mechFree = start + duration
+		self.pending.append((self.mechFree, self.held))
+		self.queued += self.held
+		self.held    = 0
+
+	def reply(self, t, b):
+		self.work(t, 0)
+		self.responses.append((self.mechFree, b))
+
+
+	# ESC/POS parsing.
+
+	def parse(self, b, t):
+		if self.rasterRows:
+			self.rowFill += 1
+			if self.rowFill == self.rasterBytes:
+				self.rowFill     = 0
+				self.rasterRows -= 1
+				self.work(t, self.dotPrintTime)
+			return
+
+		if self.cmd or b in (ESC, GS, DC2, FS, DLE):
+			if self.cmd == bytearray([ESC]) and b == ESC:
+				return # Stray ESC, as sent by wake()
+			self.cmd.append(b)
+			n = self.commandLength(self.cmd)
+			if n is not None and len(self.cmd) >= n:
+				cmd = self.cmd
+				self.cmd = bytearray()
+				self.execute(cmd, t)
+			elif self.cmd[:2] in (bytearray([FS, 113]), bytearray([GS, 42])):
+				self.work(t, 0) # Image data is stored as it arrives
+			return
+
+		self.text(b, t)
+
+	# Total length of the command begun in cmd, or None if more bytes
+	# are needed to tell.
+	def commandLength(self, cmd):
+		if len(cmd) < 2:
+			return None
+		c, k = cmd[0], cmd[1]
+		if c == ESC:
+			return 2 + ESC_ARGS.get(k, 0)
+		if c == GS:
+			if k == 107: # Barcode: type, data up to NUL or newline
+				if len(cmd) > 3 and cmd[-1] in (0, 10):
+					return len(cmd)
+				return None
+			if k == 118: # GS v 0: raster header (data separate)
+				return 8
+			if k == 42: # Downloaded bit image definition
+				if len(cmd) < 4: return None
+				return 4 + cmd[2] * cmd[3] * 8
+			return 2 + GS_ARGS.get(k, 0)
+		if c == DC2:
+			if k == 42: # Bitmap header (data separate)
+				return 4
+			return 2 + DC2_ARGS.get(k, 0)
+		if c == FS:
+			if k == 113: # NV bit image definitions
+				if len(cmd) < 3: return None
+				pos = 3
+				for i in range(cmd[2]):
+					if len(cmd) < pos + 4: return None
+					x = cmd[pos]     + cmd[pos + 1] * 256
+					y = cmd[pos + 2] + cmd[pos + 3] * 256
+					pos += 4 + x * y * 8
+				return pos
+			return 2 + FS_ARGS.get(k, 0)
+		if c == DLE:
+			return 2 + DLE_ARGS.get(k, 0)
+		return 1
+
+	def execute(self, cmd, t):
+		c, k = cmd[0], cmd[1] if len(cmd) > 1 else None
+		duration = 0
+		if c == ESC:
+			if k == 64: # @: initialize
+				self.reset()
+			elif k == 33: # !: print mode
+				self.printMode = cmd[2]
+				self.setCharSize()
+			elif k == 51: # 3: line height
+				self.lineHeight = cmd[2]
+			elif k == 74: # J: feed rows
+				duration = cmd[2] * self.dotFeedTime
+			elif k == 100: # d: feed lines
+				duration = cmd[2] * self.lineHeight * self.dotFeedTime
+			elif k == 118: # v: paper status
+				return self.reply(t, 0)
+		elif c == GS:
+			if k == 33: # !: character size
+				self.sizeMode = cmd[2]
+				self.setCharSize()
+			elif k == 104: # h: barcode height
+				self.barcodeHeight = cmd[2]
+			elif k == 107: # k: print barcode
+				duration = (self.barcodeHeight + 40) * self.dotPrintTime
+			elif k == 73: # I: printer ID
+				if cmd[2] == 65 and self.firmware is not None:
+					for b in bytearray(b'_' +
+					  self.firmware.encode('latin-1') + b'\0'):
+						self.reply(t, b)
+				return self.work(t, 0)
+			elif k == 118: # v 0: raster bitmap
+				self.startRaster(
+				  cmd[4] + cmd[5] * 256, cmd[6] + cmd[7] * 256)
+			elif k == 42: # *: define downloaded image
+				self.ramHeight = cmd[3] * 8
+			elif k == 47: # /: print downloaded image
+				duration = self.ramHeight * self.dotPrintTime
+		elif c == DC2:
+			if k == 42: # *: bitmap
+				self.startRaster(cmd[3], cmd[2])
+			elif k == 84: # T: test page
+				duration = (self.dotPrintTime * 24 * 26 +
+				            self.dotFeedTime  * (8 * 26 + 32))
+		elif c == FS:
+			if k == 113: # q: define NV images
+				self.nvHeights = []
+				pos = 3
+				for i in range(cmd[2]):
+					x = cmd[pos]     + cmd[pos + 1] * 256
+					y = cmd[pos + 2] + cmd[pos + 3] * 256
+					self.nvHeights.append(y * 8)
+					pos += 4 + x * y * 8
+			elif k == 112: # p: print NV image
+				n = cmd[2] - 1
+				if 0 <= n < len(self.nvHeights):
+					duration = self.nvHeights[n] * self.dotPrintTime
+		elif c == DLE:
+			if k == 4: # EOT: real-time status
+				return self.reply(t, 0x12)
+		self.work(t, duration)
+
+	def startRaster(self, rowBytes, rows):
+		if rowBytes and rows:
+			self.rasterBytes = rowBytes
+			self.rasterRows  = rows
+			self.rowFill     = 0
+
+	def text(self, b, t):
+		if b == 10 or b == 12: # Newline or form feed
+			if self.wrapped:
+				self.wrapped = False
+				self.work(t, 0)
+			elif self.column == 0:
+				self.work(t, self.lineHeight * self.dotFeedTime)
+			else:
+				self.printLine(t)
+		elif b >= 32 or b == 9:
+			self.wrapped = False
+			self.column += 1
+			if self.column >= self.maxColumn:
+				self.printLine(t)
+				self.wrapped = True
+		else:
+			self.work(t, 0) # Other control codes are ignored
+
+	def printLine(self, t):
+		self.column = 0
+		feed = max(0, self.lineHeight - self.charHeight)
+		self.work(t, self.charHeight * self.dotPrintTime +
+		             feed * self.dotFeedTime)
@@ -3,12 +3,15 @@
 from __future__ import print_function
 import subprocess, time, Image, socket
 from Adafruit_Thermal import *
+from bitmapcache import BitmapCache
+from logos import LogoRegistry
 
-printer      = Adafruit_Thermal("/dev/ttyAMA0", 9600, timeout=5)
+printer      = Adafruit_Thermal("/dev/ttyAMA0", 9600, timeout=5,
+                                cache=BitmapCache(), logos=LogoRegistry())
 
 # Called after every action.
 def face():
-  printer.printImage(Image.open('gfx/face01.png'), True)
+  printer.printLogo(Image.open('gfx/face01.png'), True)
   printer.feed(7)
   
 
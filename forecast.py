@@ -16,6 +16,7 @@
 from __future__ import print_function
 import urllib, time
 from Adafruit_Thermal import *
+import printerd
 from xml.dom.minidom import parseString
 
 # WOEID indicates the geographic location for the forecast.  It is
@@ -38,7 +39,8 @@ def forecast(idx):
 	printer.print(deg)
 	printer.println(' ' + cond)
 
-printer = Adafruit_Thermal("/dev/ttyAMA0", 9600, timeout=5)
+printer = printerd.connect("/dev/ttyAMA0", 9600, timeout=5,
+                           priority='daily')
 deg     = chr(0xf8) # Degree symbol on thermal printer
 # grw - Apr 19, 2016
 # Updated Yahoo API query to new YQL format
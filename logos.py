@@ -0,0 +1,94 @@
+# Registry of images stored in printers' non-volatile memory, for
+# Adafruit_Thermal.printLogo().
+#
+# Printing a bitmap means sending all of it: about 18K for the 384x384
+# face printed after every action, or 20 seconds at 9600 baud.  The
+# printer can instead keep images in flash memory (FS q) and print
+# one on request with a four-byte command (FS p).  Pass a LogoRegistry
+# to Adafruit_Thermal (the 'logos' argument) and use printLogo() for
+# images that recur:
+#
+#   printer = Adafruit_Thermal('/dev/ttyAMA0', 9600, logos=LogoRegistry())
+#   printer.printLogo(Image.open('gfx/face01.png'))
+#
+# The registry remembers, per serial port, which bitmaps (by content
+# hash) are in which of the printer's image slots, and keeps a copy of
+# each so the set can be rewritten: FS q always replaces every stored
+# image at once.  When a new logo doesn't fit (maxLogos or maxBytes),
+# the ones stored longest ago are dropped to make room.  The registry
+# can't tell if a printer has been swapped or had its memory cleared;
+# call forget() (or delete the file) if so.
+#
+# Flash wears with writes, so images are only stored when the set of
+# logos changes, never on each print.
+
+import base64, hashlib, json, os
+
+class LogoRegistry(object):
+
+	maxLogos = 4
+	maxBytes = 65536 # NV capacity varies by model; lower if stores fail
+
+	def __init__(self, path='~/.Adafruit_Thermal_logos.json',
+	  maxLogos=None, maxBytes=None):
+		self.path = os.path.expanduser(path)
+		if maxLogos is not None:
+			self.maxLogos = maxLogos
+		if maxBytes is not None:
+			self.maxBytes = maxBytes
+		try:
+			with open(self.path) as f:
+				self.ports = json.load(f)
+		except (IOError, OSError, ValueError):
+			self.ports = {} # port: list of entries, slot 1 first
+
+	# Returns the NV image number for a bitmap on this printer, storing
+	# it (with the others kept for the port) if it isn't there already.
+	# Returns None if the bitmap can't be stored.
+	def slot(self, printer, width, height, bitmap):
+		digest  = hashlib.sha1(bytearray([width & 0xFF, width >> 8,
+		  height & 0xFF, height >> 8]) + bytearray(bitmap)).hexdigest()
+		port    = printer.port or ''
+		entries = self.ports.get(port, [])
+		for i, e in enumerate(entries):
+			if e['digest'] == digest:
+				return i + 1
+
+		size = self.size(width, height)
+		if size > self.maxBytes or height > 2304:
+			return None
+		entries = entries + [ { 'digest': digest,
+		                        'width' : width,
+		                        'height': height,
+		                        'data'  : base64.b64encode(
+		                          bytes(bitmap)).decode('ascii') } ]
+		while (len(entries) > self.maxLogos or sum(self.size(
+		  e['width'], e['height']) for e in entries) > self.maxBytes):
+			entries.pop(0)
+		printer.defineNVImages([ (e['width'], e['height'],
+		  bytearray(base64.b64decode(e['data']))) for e in entries ])
+		self.ports[port] = entries
+		self.save()
+		return len(entries)
+
+	# Bytes of printer memory taken by an image.
+	def size(self, width, height):
+		return ((width + 7) // 8) * ((height + 7) // 8) * 8
+
+	# Discards what's known about a port's (or every port's) stored
+	# images; they'll be stored again as needed.
+	def forget(self, port=None):
+		if port is None:
+			self.ports = {}
+		else:
+			self.ports.pop(port, None)
+		self.save()
+
+	def save(self):
+		tmp = self.path + '.tmp'
+		try:
+			with open(tmp, 'w') as f:
+				json.dump(self.ports, f)
+			os.rename(tmp, self.path)
+		except (IOError, OSError):
+			pass
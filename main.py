@@ -18,6 +18,11 @@ from __future__ import print_function
 import RPi.GPIO as GPIO
 import subprocess, time, Image, socket
 from Adafruit_Thermal import *
+from bitmapcache import BitmapCache
+from logos import LogoRegistry
+from printerd import PrinterDaemon
+from scheduler import PrintScheduler
+from spool import PrintSpool
 import threading
 import server
 import printer
@@ -29,14 +34,18 @@ tapTime      = 0.01  # Debounce time for button taps
 nextInterval = 0.0   # Time of next recurring operation
 dailyFlag    = False # Set after daily trigger occurs
 lastId       = '1'   # State information passed to/from interval script
-device      = Adafruit_Thermal("/dev/ttyAMA0", 9600, timeout=5)
+device      = Adafruit_Thermal("/dev/ttyAMA0", 9600, timeout=5,
+                               cache=BitmapCache(), logos=LogoRegistry())
 started      = False # Flag signaling the server has started
+scheduler    = PrintScheduler(device) # Its lock guards all use of device
+daemon       = PrinterDaemon(device, scheduler=scheduler)
 
 
 # Called after every action.
 def face():
-  device.printImage(Image.open('gfx/face01.png'), True)
-  device.feed(7)
+  with scheduler.lock:
+    device.printLogo(Image.open('gfx/face01.png'), True)
+    device.feed(7)
   
 # Called when button is briefly tapped.  Invokes time/temperature script.
 def tap():
@@ -49,8 +58,9 @@ def tap():
 # Called when button is held down.  Prints image, invokes shutdown process.
 def hold():
   GPIO.output(ledPin, GPIO.HIGH)
-  device.printImage(Image.open('gfx/goodbye.png'), True)
-  device.feed(9)
+  with scheduler.lock:
+    device.printImage(Image.open('gfx/goodbye.png'), True)
+    device.feed(9)
   time.sleep(5)
   subprocess.call("sync")
   subprocess.call(["shutdown", "-h", "now"])
@@ -120,6 +130,18 @@ prevTime        = time.time()
 tapEnable       = False
 holdEnable      = False
 
+# Serve the printer to the tap/interval/daily scripts, which connect
+# rather than each opening and reinitializing the port.  Their jobs and
+# web orders are printed by priority: taps first, then web images, the
+# Twitter feed and the daily forecast.
+scheduler.start()
+daemon.start()
+
+# Pass web orders to the scheduler as they arrive, by way of a spool on
+# disk so none are lost to a crash or shutdown (any left unprinted last
+# time are resumed now)
+printer.PrintWorker(device, scheduler=PrintSpool(scheduler)).start()
+
 # Starts the webservice
 webservice_thread = threading.Thread(target=server.run_webservice)
 webservice_thread.start()
@@ -163,12 +185,6 @@ while(True):
   else:
     GPIO.output(ledPin, GPIO.LOW)
 
-  # Prints the printer queue
-  while not printer.queue.empty():
-
-    print_order = printer.queue.get()
-    print_order.execute()
-
   # Once per day (currently set for 6:30am local time, or when script
   # is first run, if after 6:30am), run forecast and sudoku scripts.
   l = time.localtime()
@@ -1,4 +1,4 @@
-import time
+import threading, time
 from multiprocessing import Queue
 from Adafruit_Thermal import *
 
@@ -21,13 +21,19 @@ class PrintOrder(object):
     def __init__(self, f, *args):
         self.f = f
         self.args = args
+        self.enqueued = monotonic()  # Orders are queued as they're made
 
-    def execute(self):
+    # Runs the order, on 'device' if given (see printerpool.py),
+    # else on the module's default device.
+    def execute(self, device=None):
+        kwargs = {}
+        if device is not None:
+            kwargs['device'] = device
 
         if self.args.__len__() == 0:
-            self.f()
+            self.f(**kwargs)
         else:
-            self.f(self.args)
+            self.f(self.args, **kwargs)
 
 
 # device = DummyDevice()
@@ -35,6 +41,58 @@ device = Adafruit_Thermal("/dev/ttyAMA0", 9600, timeout=5)
 queue = Queue()
 
 
-def print_image(data):
+def print_image(data, device=device):
   device.printImage(data[0], True)
-  device.feed(7)
\ No newline at end of file
+  device.feed(7)
+
+
+# Executes orders from the queue as soon as they arrive, rather than
+# whenever a polling loop gets around to checking.  Each order is run
+# as a job on the device (see Adafruit_Thermal.job()), so its stats,
+# including latency from enqueue to first byte, go to the stats log if
+# one is set; recent latencies are also kept in 'latencies'.  If other
+# threads print on the same device, give them all the same lock.  With
+# a scheduler (see scheduler.py) or spool (spool.py), orders are instead
+# passed to it in priority class 'web', still timed from when they were
+# queued.
+class PrintWorker(threading.Thread):
+
+    keep = 100  # Number of latencies kept
+
+    def __init__(self, device=device, source=queue, lock=None,
+                 scheduler=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.device = device
+        self.source = source
+        self.lock = lock or threading.Lock()
+        self.scheduler = scheduler
+        self.latencies = []
+
+    def run(self):
+        while True:
+            order = self.source.get()
+            try:
+                if self.scheduler is not None:
+                    # Compiling lays out (rasterizes) the order here
+                    job = self.scheduler.prepare(order.execute)
+                    self.scheduler.submit('web', job, order.enqueued,
+                                          callback=self.started)
+                    continue
+                with self.lock:
+                    with self.device.job(order.f.__name__,
+                                         enqueued=order.enqueued) as stats:
+                        order.execute(self.device)
+            except Exception as e:
+                print 'Print order failed: %s' % e
+                continue
+            self.record(stats.latency)
+
+    # Scheduler callback for orders it prints.
+    def started(self, entry, event):
+        if event == 'started':
+            self.record(entry.latency)
+
+    def record(self, latency):
+        self.latencies.append(latency)
+        del self.latencies[:-self.keep]
\ No newline at end of file
@@ -0,0 +1,288 @@
+# Printer daemon: one long-lived process owns the serial port and prints
+# jobs sent to it over a Unix domain socket.
+#
+# Each script that makes its own Adafruit_Thermal pays for wake(),
+# reset() and the heat settings (over a second) and fights any other
+# process for the port.  Instead, the process holding the printer (e.g.
+# main.py) serves it:
+#
+#   daemon = PrinterDaemon(printer)
+#   daemon.start()
+#
+# and scripts connect with a client having the same printing methods:
+#
+#   printer = printerd.connect('/dev/ttyAMA0', 9600, timeout=5)
+#   printer.println('Hello!')
+#
+# connect() falls back to opening the port directly if no daemon is
+# running, so scripts still work on their own.
+#
+# The client lays out each call locally, compiling it into a PrintJob
+# (see printjob.py) with the daemon's timing settings, and sends it in
+# one message; the daemon streams it to the printer with its pacing.
+# Messages in either direction are a header (magic, type, payload
+# length) and payload:
+#
+#   INFO   -> OK, byteTime, dotPrintTime, dotFeedTime, rasterBitmaps
+#   JOB    (class name length, class name, job name length, job name,
+#          PrintJob.dumps())
+#          -> OK, JobStats as JSON (if recorded), once the job has been
+#          sent (ERROR if it failed)
+#   STATUS -> OK, paper present (1 byte)
+#
+# or ERROR with a message.  Jobs from all clients print one at a time.
+# If the daemon has a PrintScheduler (see scheduler.py), jobs given a
+# priority class (the 'priority' argument to the client) go through
+# it; others are printed as they come.
+#
+# The client's job() (see Adafruit_Thermal.job()) sends everything
+# printed in its block as one named job.  Its stats are recorded by the
+# daemon as it prints, and go to the daemon's stats log; the client's
+# layout-only printer has no real timing to measure.
+
+from __future__ import print_function
+from Adafruit_Thermal import Adafruit_Thermal
+from Adafruit_Thermal import JobStats
+from printjob import (JobRecorder, PrintJob, compileJob, recording, sendJob,
+  printMethods)
+from contextlib import contextmanager
+import json, os, socket, struct, threading
+try:
+	import socketserver
+except ImportError: # Python 2.X
+	import SocketServer as socketserver
+
+socketPath = '/tmp/Adafruit_Thermal.sock'
+
+MAGIC  = b'ATPD'
+HEADER = struct.Struct('<4sBI') # Magic, type, payload length
+SETUP  = struct.Struct('<dddB') # byteTime, print time, feed time, raster
+
+# Message types
+OK     = 0
+JOB    = 1
+STATUS = 2
+INFO   = 3
+ERROR  = 255
+
+def sendMessage(sock, kind, payload=b''):
+	sock.sendall(HEADER.pack(MAGIC, kind, len(payload)) + payload)
+
+def recvExactly(sock, n):
+	buf = bytearray()
+	while len(buf) < n:
+		data = sock.recv(n - len(buf))
+		if not data:
+			raise EOFError('Connection closed')
+		buf += data
+	return bytes(buf)
+
+def recvMessage(sock):
+	magic, kind, length = HEADER.unpack(recvExactly(sock, HEADER.size))
+	if magic != MAGIC:
+		raise ValueError('Not a printer daemon message')
+	return kind, recvExactly(sock, length)
+
+
+class PrinterDaemon(socketserver.ThreadingMixIn,
+  socketserver.UnixStreamServer):
+
+	daemon_threads = True
+
+	def __init__(self, printer, path=socketPath, scheduler=None):
+		if os.path.exists(path):
+			os.remove(path) # Left by a previous run
+		socketserver.UnixStreamServer.__init__(self, path, DaemonHandler)
+		self.printer   = printer
+		self.path      = path
+		self.scheduler = scheduler
+		# Held while printing; anything else in this process using
+		# the printer directly should hold it too.
+		if scheduler is not None:
+			self.lock = scheduler.lock
+		else:
+			self.lock = threading.Lock()
+
+	# Serves in a background thread.
+	def start(self):
+		t = threading.Thread(target=self.serve_forever)
+		t.daemon = True
+		t.start()
+		return self
+
+	def server_close(self):
+		socketserver.UnixStreamServer.server_close(self)
+		if os.path.exists(self.path):
+			os.remove(self.path)
+
+
+class DaemonHandler(socketserver.BaseRequestHandler):
+
+	def handle(self):
+		while True:
+			try:
+				kind, payload = recvMessage(self.request)
+			except (EOFError, ValueError, socket.error):
+				return
+			try:
+				reply = self.execute(kind, payload)
+			except Exception as e:
+				sendMessage(self.request, ERROR, str(e).encode('utf-8'))
+			else:
+				sendMessage(self.request, OK, reply)
+
+	def execute(self, kind, payload):
+		printer = self.server.printer
+		if kind == JOB:
+			n    = bytearray(payload[:1])[0]
+			cls  = payload[1:1 + n].decode('ascii')
+			pos  = 1 + n
+			n    = bytearray(payload[pos:pos + 1])[0]
+			name = payload[pos + 1:pos + 1 + n].decode('utf-8')
+			job  = PrintJob.loads(payload[pos + 1 + n:])
+			if cls and self.server.scheduler is not None:
+				entry = self.server.scheduler.submit(cls, job,
+				  name=name or None)
+				entry.done.wait()
+				if entry.error is not None:
+					raise entry.error
+				stats = entry.stats
+			elif name:
+				with self.server.lock:
+					with printer.job(name) as stats:
+						sendJob(printer, job)
+			else:
+				with self.server.lock:
+					sendJob(printer, job)
+				return b''
+			return stats.json().encode('utf-8')
+		with self.server.lock:
+			if kind == STATUS:
+				return struct.pack('<B', printer.hasPaper())
+			if kind == INFO:
+				return SETUP.pack(printer.byteTime, printer.dotPrintTime,
+				  printer.dotFeedTime, printer.rasterBitmaps)
+		raise ValueError('Unknown request %d' % kind)
+
+
+# Client side.  Has the printing methods of Adafruit_Thermal (see
+# printjob.printMethods); each call is compiled by a layout-only
+# printer and sent as a job.  kwargs are as for Adafruit_Thermal (e.g.
+# cache), less the serial and timing settings, which are the daemon's.
+# Logos are printed as ordinary images: the printer's NV memory is the
+# daemon's to manage.  'priority' is the scheduling class for jobs.
+class PrinterClient(object):
+
+	def __init__(self, path=socketPath, priority=None, **kwargs):
+		self.priority = (priority or '').encode('ascii')
+		self.jobName  = None # Set while recording a job()
+		self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		try:
+			self.sock.connect(path)
+			byteTime, printTime, feedTime, raster = SETUP.unpack(
+			  self.request(INFO))
+		except Exception:
+			self.sock.close()
+			raise
+		kwargs['profile']   = None
+		kwargs['transport'] = JobRecorder()
+		self.printer = Adafruit_Thermal(None,
+		  int(round(11.0 / byteTime)), **kwargs)
+		self.printer.setTimes(printTime * 1000000.0, feedTime * 1000000.0)
+		self.printer.rasterBitmaps = bool(raster)
+		# The printer's settings are whatever the last user left, so
+		# don't skip any as unchanged
+		self.printer.invalidateState()
+
+	def request(self, kind, payload=b''):
+		sendMessage(self.sock, kind, payload)
+		kind, reply = recvMessage(self.sock)
+		if kind == ERROR:
+			raise IOError('Printer daemon: ' + reply.decode('utf-8'))
+		return reply
+
+	# Compiles printer.<name>(*args, **kwargs) and prints the result
+	# (or, in a job() block, adds it to the job).
+	def run(self, name, *args, **kwargs):
+		if self.jobName is not None:
+			getattr(self.printer, name)(*args, **kwargs)
+			return
+		if self.priority:
+			# Other jobs may come between this one and the last
+			self.printer.invalidateState()
+		job = compileJob(self.printer,
+		  getattr(self.printer, name), *args, **kwargs)
+		self.send(job)
+
+	# Sends a compiled job; returns its stats, as a dict, if the
+	# daemon recorded them.
+	def send(self, job, name=''):
+		if not job.data:
+			return None
+		name  = name.encode('utf-8')[:255]
+		reply = self.request(JOB, bytearray([len(self.priority)]) +
+		  self.priority + bytearray([len(name)]) + name + job.dumps())
+		if reply:
+			return json.loads(reply.decode('utf-8'))
+		return None
+
+	def hasPaper(self):
+		return bool(struct.unpack('<B', self.request(STATUS))[0])
+
+	# As Adafruit_Thermal.job(), but everything printed in the block
+	# is sent as one job once the block ends, and the stats are those
+	# the daemon measured printing it (filled in then).
+	@contextmanager
+	def job(self, name=None, callback=None):
+		if self.jobName is not None: # Already in a job
+			yield JobStats(name)
+			return
+		if self.priority:
+			self.printer.invalidateState()
+		stats = JobStats(name)
+		self.jobName = name or 'job'
+		try:
+			with recording(self.printer) as job:
+				yield stats
+		finally:
+			self.jobName = None
+		result = self.send(job, name or 'job')
+		if result is not None:
+			loadStats(stats, result)
+		if callback is not None:
+			callback(stats)
+
+	def close(self):
+		self.sock.close()
+
+
+# Fills in a JobStats from the daemon's asDict() of it.
+def loadStats(stats, fields):
+	for key in ('bytes', 'writes', 'writeTime', 'stalls', 'stallTime',
+	  'histogram', 'modeledTime', 'latency', 'elapsed', 'estimated'):
+		setattr(stats, key, fields.get(key))
+	stats.start     = 0.0
+	stats.firstByte = fields.get('firstByte') # Relative to start
+
+
+def printMethod(name):
+	def method(self, *args, **kwargs):
+		self.run(name, *args, **kwargs)
+	method.__name__ = name
+	method.__doc__  = 'Daemon client version of Adafruit_Thermal.%s()' % name
+	return method
+
+for name in printMethods:
+	setattr(PrinterClient, name, printMethod(name))
+
+
+# Returns a client of the daemon if one is running, else an
+# Adafruit_Thermal opened with the arguments given.
+def connect(*args, **kwargs):
+	path     = kwargs.pop('path', socketPath)
+	priority = kwargs.pop('priority', None)
+	try:
+		client = PrinterClient(path, priority, cache=kwargs.get('cache'))
+	except (socket.error, EOFError, ValueError, struct.error):
+		return Adafruit_Thermal(*args, **kwargs)
+	return client
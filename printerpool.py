@@ -0,0 +1,186 @@
+# Spreads print jobs across several printers.
+#
+# A PrinterPool manages a set of Adafruit_Thermal devices, each driven
+# by its own worker thread.  Jobs (printer.PrintOrder objects) are
+# dispatched to whichever healthy printer is expected to be idle
+# soonest, based on an estimate of each queued job's print time:
+#
+#   pool = PrinterPool([ Adafruit_Thermal('/dev/ttyAMA0', 9600, timeout=5),
+#                        Adafruit_Thermal('/dev/ttyUSB0', 9600, timeout=5) ])
+#   pool.start(printer.queue) # Dispatch everything put on the queue
+#
+# Job times are estimated by compiling each job (see printjob.py) with
+# a separate layout-only printer, so estimating never disturbs the real
+# devices.
+#
+# Each printer's status is queried after every job, since writes to a
+# jammed or empty printer don't fail.  One that raises an I/O error,
+# doesn't answer or reports no paper is taken out of rotation; its
+# queued jobs go to the other printers.  It's checked again every
+# retryInterval seconds and returns once it answers a status query with
+# paper present.
+#
+# A job that fails by itself (e.g. an image that can't be decoded) is
+# not the printer's fault.  Jobs that can't be compiled are rejected by
+# submit(); a job that raises anything other than an I/O error while
+# printing is dropped, as is one that has already been tried on
+# maxAttempts printers, so a bad job can't take the pool down.
+
+from __future__ import print_function
+from Adafruit_Thermal import Adafruit_Thermal, monotonic
+from printjob import JobRecorder, compileJob
+import threading
+try:
+	import queue
+except ImportError: # Python 2.X
+	import Queue as queue
+
+class PrinterPool(object):
+
+	retryInterval = 30.0
+	maxAttempts   =  2   # Printers a job is tried on before it's dropped
+
+	def __init__(self, devices):
+		self.lock      = threading.Lock()
+		self.workers   = [ PoolWorker(self, d) for d in devices ]
+		self.held      = [] # Jobs waiting for any printer to recover
+		self.estimator = Adafruit_Thermal(
+		  transport=JobRecorder(), profile=None)
+
+	# Starts the workers and, if a queue is given, a thread
+	# dispatching jobs from it.
+	def start(self, source=None):
+		for w in self.workers:
+			w.start()
+		if source is not None:
+			t = threading.Thread(target=self.dispatchFrom, args=(source,))
+			t.daemon = True
+			t.start()
+		return self
+
+	def dispatchFrom(self, source):
+		while True:
+			self.submit(source.get())
+
+	# Estimated print time of a job, in seconds.  Raises whatever
+	# the job does if it can't be laid out.
+	def estimate(self, order):
+		return compileJob(self.estimator,
+		  order.execute, self.estimator).duration
+
+	# Queues a job on the printer expected to be free soonest.
+	# Returns False if the job was rejected (it fails to compile).
+	# 'attempts' is the number of printers it has failed on.
+	def submit(self, order, estimate=None, attempts=0):
+		if estimate is None:
+			try:
+				estimate = self.estimate(order)
+			except Exception as e:
+				print('Print job rejected: %s' % e)
+				return False
+		with self.lock:
+			healthy = [ w for w in self.workers if w.healthy ]
+			if not healthy:
+				self.held.append((order, estimate, attempts))
+				return True
+			worker = min(healthy, key=lambda w: w.idleAt())
+			worker.queued += estimate
+		worker.jobs.put((order, estimate, attempts))
+		return True
+
+	def recovered(self, worker):
+		with self.lock:
+			held      = self.held
+			self.held = []
+		for job in held:
+			self.submit(*job)
+
+	# Total jobs printed and failed, per device.
+	def status(self):
+		return [ { 'device'  : w.device.port,
+		           'healthy' : w.healthy,
+		           'printed' : w.printed,
+		           'failed'  : w.failed,
+		           'idleAt'  : w.idleAt() } for w in self.workers ]
+
+
+class PoolWorker(threading.Thread):
+
+	def __init__(self, pool, device):
+		threading.Thread.__init__(self)
+		self.daemon  = True
+		self.pool    = pool
+		self.device  = device
+		self.jobs    = queue.Queue()
+		self.healthy = True
+		self.queued  = 0.0 # Estimated time of jobs waiting here
+		self.busyEnd = 0.0 # Estimated end of the current job
+		self.printed = 0
+		self.failed  = 0
+
+	# When this printer is expected to finish all its work.
+	def idleAt(self):
+		return max(monotonic(), self.busyEnd) + self.queued
+
+	def run(self):
+		while True:
+			try:
+				order, estimate, attempts = self.jobs.get(
+				  timeout=self.pool.retryInterval)
+			except queue.Empty:
+				if not self.healthy:
+					self.probe()
+				continue
+			with self.pool.lock:
+				self.queued -= estimate
+			if not self.healthy:
+				self.pool.submit(order, estimate, attempts) # Pass it on
+				continue
+			start        = monotonic()
+			self.busyEnd = start + estimate
+			try:
+				order.execute(self.device)
+				self.device.timeoutWait()
+			except (IOError, OSError) as e:
+				print('Printer %s failed: %s' % (self.device.port, e))
+				self.failed += 1
+				self.setHealthy(False)
+				if attempts + 1 < self.pool.maxAttempts:
+					self.pool.submit(order, estimate, attempts + 1)
+				else:
+					print('Print job dropped after %d attempts' %
+					  (attempts + 1))
+				continue
+			except Exception as e:
+				# The job's own fault; the printer is fine
+				print('Print job failed: %s' % e)
+				self.failed += 1
+				continue
+			self.printed += 1
+			self.probe()
+
+	# Queries status; no reply (e.g. a jam) or no paper counts as
+	# unhealthy.
+	def probe(self):
+		try:
+			ok = self.device.hasPaper()
+		except Exception:
+			ok = False
+		self.setHealthy(ok)
+
+	def setHealthy(self, healthy):
+		if healthy == self.healthy:
+			return
+		self.healthy = healthy
+		if healthy:
+			self.pool.recovered(self)
+		else:
+			# Hand queued jobs to the other printers
+			while True:
+				try:
+					order, estimate, attempts = self.jobs.get_nowait()
+				except queue.Empty:
+					break
+				with self.pool.lock:
+					self.queued -= estimate
+				self.pool.submit(order, estimate, attempts)
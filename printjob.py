@@ -0,0 +1,227 @@
+# Compiled print jobs for Adafruit_Thermal.
+#
+# Normally each print(), feed(), printImage() etc. call interleaves
+# layout logic, timing arithmetic and serial writes.  compileJob()
+# instead runs the printing code once against a recorder, capturing
+# everything that would have been sent as one flat byte buffer plus a
+# pacing schedule: a list of (offset, time) checkpoints meaning "bytes
+# from this offset on may not be sent until this many seconds into the
+# job".  sendJob() then streams the buffer to the printer with a tight
+# loop that only waits at checkpoints.
+#
+#   job = compileJob(printer, printReceipt, order)
+#   sendJob(printer, job)
+#
+# Jobs can be saved and loaded (or sent elsewhere with dumps()/loads())
+# so the same receipt can be replayed later without re-running the
+# layout code.
+#
+# A job may also list split points (at bitmap chunk boundaries, see
+# Adafruit_Thermal.splitPoint()), where sending can stop and another
+# job be printed before the rest is sent with sendJob(..., start=...).
+# Each comes with the commands restoring the job's mode settings there,
+# or none if those are unchanged since the previous split point (see
+# restoreAt()).
+#
+# Compiling goes through the printer object itself, so its layout
+# state (column, character size, etc.) advances as if the job had been
+# printed; send the job before printing anything else through it.
+
+from __future__ import print_function
+from Adafruit_Thermal import EstimatePacer, monotonic
+from contextlib import contextmanager
+import struct
+
+class PrintJob(object):
+
+	MAGIC      = b'ATPJ'
+	VERSION    = 2
+	HEADER     = struct.Struct('<4sBIId') # Magic, version, checkpoint
+	                                      # count, data length, duration
+	CHECKPOINT = struct.Struct('<Id')     # Offset, time
+	COUNT      = struct.Struct('<I')      # Split point count (version 2)
+	SPLIT      = struct.Struct('<II')     # Offset, restore length
+
+	def __init__(self, data=None, checkpoints=None, duration=0.0,
+	  splits=None):
+		self.data        = data if data is not None else bytearray()
+		self.checkpoints = checkpoints if checkpoints is not None else []
+		self.duration    = duration # Estimated time to complete
+		self.splits      = splits if splits is not None else []
+		                   # (offset, restore commands if changed)
+
+	# Commands restoring the job's mode settings at split point 'pos'.
+	def restoreAt(self, pos):
+		restore = bytearray()
+		for offset, commands in self.splits:
+			if offset > pos:
+				break
+			if commands:
+				restore = commands
+		return restore
+
+	def dumps(self):
+		out = bytearray(self.HEADER.pack(self.MAGIC, self.VERSION,
+		  len(self.checkpoints), len(self.data), self.duration))
+		for offset, t in self.checkpoints:
+			out += self.CHECKPOINT.pack(offset, t)
+		out += self.COUNT.pack(len(self.splits))
+		for offset, restore in self.splits:
+			out += self.SPLIT.pack(offset, len(restore))
+			out += restore
+		out += self.data
+		return bytes(out)
+
+	@classmethod
+	def loads(cls, buf):
+		magic, version, count, length, duration = (
+		  cls.HEADER.unpack_from(buf))
+		if magic != cls.MAGIC or version not in (1, cls.VERSION):
+			raise ValueError('Not a compiled print job')
+		pos         = cls.HEADER.size
+		checkpoints = []
+		for i in range(count):
+			checkpoints.append(cls.CHECKPOINT.unpack_from(buf, pos))
+			pos += cls.CHECKPOINT.size
+		splits = []
+		if version > 1:
+			n,   = cls.COUNT.unpack_from(buf, pos)
+			pos += cls.COUNT.size
+			for i in range(n):
+				offset, size = cls.SPLIT.unpack_from(buf, pos)
+				pos += cls.SPLIT.size
+				splits.append((offset, bytearray(buf[pos:pos + size])))
+				pos += size
+		data = bytearray(buf[pos:pos + length])
+		if len(data) != length:
+			raise ValueError('Truncated print job')
+		return cls(data, checkpoints, duration, splits)
+
+	def save(self, path):
+		with open(path, 'wb') as f:
+			f.write(self.dumps())
+
+	@classmethod
+	def load(cls, path):
+		with open(path, 'rb') as f:
+			return cls.loads(f.read())
+
+
+# Transport that records output against a virtual clock, used while
+# compiling.  A checkpoint is logged whenever the pacer has advanced
+# the clock since the last write.
+class JobRecorder(object):
+
+	def __init__(self):
+		self.now     = 0.0
+		self.job     = PrintJob()
+		self.last    = 0.0
+		self.restore = bytearray() # Restore commands last recorded
+
+	def clock(self):
+		return self.now
+
+	def sleep(self, seconds):
+		if seconds > 0:
+			self.now += seconds
+
+	def write(self, data):
+		if self.now > self.last:
+			self.job.checkpoints.append((len(self.job.data), self.now))
+			self.last = self.now
+		self.job.data += bytearray(data)
+
+	# Records a split point (see Adafruit_Thermal.splitPoint()).
+	# Its restore commands are only kept if they've changed.
+	def mark(self, restore):
+		offset = len(self.job.data)
+		if offset > 0 and (not self.job.splits or
+		  self.job.splits[-1][0] < offset):
+			if restore == self.restore:
+				restore = bytearray()
+			else:
+				self.restore = restore
+			self.job.splits.append((offset, restore))
+
+	# The printer can't be queried while compiling.
+	def read(self, size=1):
+		return b''
+
+
+# Adafruit_Thermal methods that print (or change printer settings),
+# for front ends that compile each call into a job (asyncprinter.py,
+# printerd.py).
+printMethods = [ 'write', 'print', 'println', 'feed', 'feedRows', 'flush',
+  'writeBytes', 'setTimes', 'reset', 'setDefault', 'test', 'printBarcode',
+  'setBarcodeHeight', 'setPrintMode', 'unsetPrintMode', 'normal',
+  'inverseOn', 'inverseOff', 'upsideDownOn', 'upsideDownOff',
+  'sidewaysOn', 'sidewaysOff', 'doubleHeightOn', 'doubleHeightOff',
+  'doubleWidthOn', 'doubleWidthOff', 'strikeOn', 'strikeOff', 'boldOn',
+  'boldOff', 'justify', 'setSize', 'underlineOn', 'underlineOff',
+  'printBitmap', 'printImage', 'printLogo', 'offline', 'online', 'sleep',
+  'sleepAfter', 'wake', 'setLineHeight', 'tab', 'setCharSpacing' ]
+
+
+# Runs func(*args, **kwargs) -- which prints through 'printer' as usual
+# -- and returns the resulting PrintJob instead of printing it.
+def compileJob(printer, func, *args, **kwargs):
+	with recording(printer) as job:
+		func(*args, **kwargs)
+	return job
+
+# Block form of compileJob(): whatever is printed through 'printer'
+# in the block is recorded into the PrintJob given, which is complete
+# once the block ends.
+@contextmanager
+def recording(printer):
+	printer.sendCommands()
+	recorder  = JobRecorder()
+	transport = printer.transport
+	pacer     = printer.pacer
+	printer.transport = recorder
+	printer.pacer     = EstimatePacer(0, recorder.clock, recorder.sleep)
+	try:
+		yield recorder.job
+		printer.sendCommands()
+	finally:
+		recorder.job.duration = max(
+		  printer.pacer.resumeTime, recorder.now)
+		printer.transport = transport
+		printer.pacer     = pacer
+
+# Streams a compiled job to the printer, honoring its pacing schedule
+# (and the printer's own pacing for whatever preceded the job).  The
+# job may have been compiled elsewhere, so the printer's shadowed mode
+# state can no longer be trusted afterward.
+#
+# Only the part from offset 'start' up to 'end' is sent if those are
+# given (normally split points); timing is then relative to where the
+# job had got to at 'start', and the printer's timeout is left set for
+# when the job would be ready to continue at 'end'.
+def sendJob(printer, job, start=0, end=None):
+	if end is None:
+		end = len(job.data)
+	printer.sendCommands()
+	printer.timeoutWait()
+	clock  = getattr(printer.pacer, 'clock', monotonic)
+	origin = clock()
+	base   = 0.0 # Job time reached at 'start'
+	finish = job.duration
+	data   = memoryview(job.data)
+	pos    = start
+	for offset, t in job.checkpoints:
+		if offset <= start:
+			base = t
+			continue
+		if offset >= end and end < len(job.data):
+			finish = t
+			break
+		if offset > pos:
+			printer.sendRaw(data[pos:offset])
+			pos = offset
+		printer.timeoutSet(t - base - (clock() - origin))
+		printer.timeoutWait()
+	if pos < end:
+		printer.sendRaw(data[pos:end])
+	printer.timeoutSet(finish - base - (clock() - origin))
+	printer.invalidateState()
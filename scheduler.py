@@ -0,0 +1,228 @@
+# Priority scheduling of print jobs.
+#
+# Jobs from different sources matter differently: a button tap wants
+# its printout now, while a photo uploaded through the web page or the
+# daily forecast can wait.  A PrintScheduler prints jobs by priority
+# class rather than in arrival order:
+#
+#   scheduler = PrintScheduler(printer).start()
+#   scheduler.schedule('tap', printTimeAndTemp)
+#
+# The job function is called with a layout-only printer to print on,
+# e.g. printTimeAndTemp(p), and compiled (see printjob.py); the
+# scheduler's thread then sends the compiled jobs to the real printer,
+# most urgent first.  Lower class numbers are more urgent.  A job's
+# priority improves by agingRate per second of waiting, so a busy
+# stream of urgent jobs can't hold back the others forever.
+#
+# Long bitmaps can be interrupted: between chunks (the job's split
+# points) the scheduler checks for a more urgent job and, if there is
+# one, prints it before resuming the rest.  The interrupted job's mode
+# settings (justification, size, etc.) are restored when it resumes, if
+# anything else was printed in the meantime.
+# Jobs are compiled with no assumptions about the printer's settings,
+# so each sends whatever settings it relies on.
+#
+# Each job's JobStats (see Adafruit_Thermal.job()) are collected across
+# its parts and go to the printer's stats log, if set, when it's done.
+
+from __future__ import print_function
+from Adafruit_Thermal import Adafruit_Thermal, JobStats, monotonic
+from printjob import JobRecorder, compileJob, sendJob
+import itertools, threading
+
+class PrintScheduler(object):
+
+	classes   = { 'tap': 0, 'web': 10, 'feed': 20, 'daily': 30 }
+	agingRate = 0.1 # Priority gained per second waiting
+
+	# 'lock', if given, is held while sending to the printer (share
+	# it with anything else printing on the same device).
+	def __init__(self, printer, classes=None, lock=None):
+		self.printer   = printer
+		self.classes   = dict(classes or self.classes)
+		self.lock      = lock or threading.Lock()
+		self.cond      = threading.Condition()
+		self.pending   = []
+		self.sequence  = itertools.count()
+		self.latencies = dict((c, []) for c in self.classes)
+		self.last      = None # Job sent last...
+		self.lastSent  = 0    # ...and printer.bytesSent after it
+
+		# Jobs are laid out by a separate printer with the device's
+		# timing and bitmap settings.
+		self.layout = Adafruit_Thermal(None, printer.baudrate,
+		  transport=JobRecorder(), profile=None)
+		self.layout.setTimes(printer.dotPrintTime * 1000000.0,
+		  printer.dotFeedTime * 1000000.0)
+		for attr in ('rasterBitmaps', 'trimBitmaps', 'blankRowsMin',
+		  'bitmapCache'):
+			setattr(self.layout, attr, getattr(printer, attr))
+		self.compileLock = threading.Lock()
+
+	# Each job starts with no settings known, so it sends all it
+	# relies on, and its split points restore only those.
+	def compile(self, func, *args, **kwargs):
+		self.layout.invalidateState()
+		return compileJob(self.layout, func, *args, **kwargs)
+
+	# Schedules func(printer, *args, **kwargs) in priority class
+	# 'cls'.  Returns a ScheduledJob; its 'done' event is set once the
+	# job has been sent, or has failed (its 'error' is then set).
+	def schedule(self, cls, func, *args, **kwargs):
+		return self.submit(cls, self.prepare(func, *args, **kwargs))
+
+	# Compiles func(printer, *args, **kwargs) for scheduling later.
+	def prepare(self, func, *args, **kwargs):
+		with self.compileLock:
+			return self.compile(func, self.layout, *args, **kwargs)
+
+	# Schedules an already compiled PrintJob.  'enqueued' is when the
+	# job was queued (monotonic()), if earlier than now; latency is
+	# measured from then.  A job partly sent before can be resumed
+	# from one of its split points ('pos').  'name' labels the job's
+	# stats (the class name if not given).
+	# callback, if given, is called as callback(entry, event) when the
+	# job is 'started', reaches each split point ('progress') and is
+	# 'completed', or if sending it 'failed'.
+	def submit(self, cls, job, enqueued=None, pos=0, callback=None,
+	  name=None):
+		if cls not in self.classes:
+			raise ValueError('Unknown priority class: %s' % cls)
+		entry = ScheduledJob(cls, self.classes[cls], job,
+		  enqueued or monotonic(), next(self.sequence))
+		entry.callback = callback
+		entry.name     = name or cls
+		if pos:
+			entry.pos     = pos
+			entry.restore = job.restoreAt(pos)
+		with self.cond:
+			self.pending.append(entry)
+			self.cond.notify()
+		return entry
+
+	def start(self):
+		t = threading.Thread(target=self.run)
+		t.daemon = True
+		t.start()
+		return self
+
+	# Current priority of a waiting job (lower is more urgent).
+	def priority(self, entry, now):
+		return entry.priority - (now - entry.enqueued) * self.agingRate
+
+	# Removes and returns the most urgent pending job, if it's more
+	# urgent than 'current' (if given).
+	def take(self, current=None):
+		with self.cond:
+			while current is None and not self.pending:
+				self.cond.wait()
+			if not self.pending:
+				return None
+			now  = monotonic()
+			best = min(self.pending,
+			  key=lambda e: (self.priority(e, now), e.sequence))
+			if current is not None and (self.priority(best, now) >=
+			  self.priority(current, now)):
+				return None
+			self.pending.remove(best)
+			return best
+
+	def run(self):
+		while True:
+			self.resume(self.take())
+
+	# Sends a job from where it left off, split point by split point,
+	# giving way to any more urgent job in between.  A job that fails
+	# (e.g. the port has gone) is dropped, so the rest still print.
+	def resume(self, entry):
+		job    = entry.job
+		splits = [ s for s in job.splits if s[0] > entry.pos ]
+		while True:
+			if splits:
+				end, restore = splits.pop(0)
+			else:
+				end, restore = len(job.data), None
+			try:
+				with self.lock:
+					if entry.latency is None:
+						entry.latency = monotonic() - entry.enqueued
+						entry.stats   = JobStats(entry.name,
+						  getattr(self.printer.pacer, 'clock', monotonic))
+						entry.stats.latency = entry.latency
+						self.record(entry)
+						entry.notify('started')
+					outer = self.printer.stats
+					self.printer.stats = entry.stats
+					try:
+						self.send(entry, end)
+					finally:
+						self.printer.stats = outer
+				entry.pos = end
+				if restore:
+					entry.restore = restore
+				if restore is None:
+					self.finish(entry)
+					entry.notify('completed')
+				else:
+					entry.notify('progress')
+			except Exception as e:
+				print('Print job failed: %s' % e)
+				entry.error = e
+				try:
+					entry.notify('failed')
+				except Exception:
+					pass
+				entry.done.set()
+				return
+			if restore is None:
+				entry.done.set()
+				return
+			other = self.take(entry)
+			if other is not None:
+				with self.cond:
+					self.pending.append(entry) # Resumes later
+				self.resume(other)
+				return
+
+	# Sends a job's next part, up to 'end' (with the lock held).
+	def send(self, entry, end):
+		if entry.restore and (self.last is not entry or
+		  self.printer.bytesSent != self.lastSent):
+			# Something else printed since this job's last part
+			self.printer.writeBytes(*entry.restore)
+		sendJob(self.printer, entry.job, entry.pos, end)
+		self.last     = entry
+		self.lastSent = self.printer.bytesSent
+
+	def finish(self, entry):
+		entry.stats.finish(self.printer.pacer)
+		if self.printer.statsLog:
+			self.printer.logStats(entry.stats)
+
+	def record(self, entry):
+		latencies = self.latencies.setdefault(entry.cls, [])
+		latencies.append(entry.latency)
+		del latencies[:-100]
+
+
+class ScheduledJob(object):
+
+	def __init__(self, cls, priority, job, enqueued, sequence):
+		self.cls      = cls
+		self.priority = priority
+		self.job      = job
+		self.enqueued = enqueued
+		self.sequence = sequence
+		self.pos      = 0    # Offset sent up to
+		self.restore  = None # Commands restoring mode settings at pos
+		self.latency  = None # Enqueue to first byte, seconds
+		self.stats    = None # JobStats, once started
+		self.error    = None # Exception if sending failed
+		self.callback = None
+		self.name     = cls  # For stats
+		self.done     = threading.Event()
+
+	def notify(self, event):
+		if self.callback is not None:
+			self.callback(self, event)
@@ -2,16 +2,38 @@ import tornado.httpserver
 import tornado.ioloop
 import tornado.web
 import tornado.websocket
-from PIL import Image
+from PIL import Image, ImageFile
 from io import BytesIO
 import base64
 from printer import PrintOrder
 import printer
 
 
+# Images may be sent to /ws in any of three ways:
+#
+#   - a text message holding the whole image, base64 encoded (as sent
+#     by older pages);
+#   - a binary message holding the whole image;
+#   - a chunked upload: a text message 'begin <size>', binary messages
+#     with the image data, in order, then a text message 'end'.  Each
+#     chunk is answered 'ok <bytes received so far>'.  If an upload
+#     fails part way, the error is sent once and the rest of its chunks
+#     are ignored up to its 'end'.
+#
+# Chunks are decoded as they arrive (the Imaging Library's incremental
+# parser; JPEG decodes progressively, other formats once complete), so
+# the upload is never held whole in memory.  Uploads larger than
+# maxUploadBytes, or images larger than maxPixels, are refused.
+maxUploadBytes = 8 * 1024 * 1024
+maxPixels = 4096 * 4096
+
+
 # Defines the webservice handler
 class WSHandler(tornado.websocket.WebSocketHandler):
 
+    upload = None     # Parser of chunked upload in progress
+    aborted = False   # Set while skipping the rest of a failed upload
+
     def data_received(self, chunk):
         pass
 
@@ -22,7 +44,59 @@ class WSHandler(tornado.websocket.WebSocketHandler):
         print('user is connected.\n')
 
     def on_message(self, message):
-        image = Image.open(BytesIO(base64.b64decode(message)))
+        try:
+            if isinstance(message, bytes) and self.aborted:
+                pass  # Rest of a failed upload
+            elif isinstance(message, bytes) and self.upload is not None:
+                self.receive_chunk(message)
+            elif isinstance(message, bytes):
+                self.print_image(Image.open(BytesIO(message)))
+            elif message.startswith('begin'):
+                # Its chunks are skipped unless it starts cleanly
+                self.aborted = True
+                self.begin_upload(int(message.split()[1]))
+                self.aborted = False
+            elif message == 'end' and self.aborted:
+                self.aborted = False
+            elif message == 'end':
+                self.end_upload()
+            else:
+                self.print_image(
+                    Image.open(BytesIO(base64.b64decode(message))))
+        except Exception as e:
+            self.aborted = self.aborted or self.upload is not None
+            self.upload = None
+            self.write_message('error: %s' % e)
+
+    def begin_upload(self, size):
+        if size > maxUploadBytes:
+            raise ValueError('upload too large')
+        self.upload = ImageFile.Parser()
+        self.upload_size = size
+        self.received = 0
+
+    def receive_chunk(self, chunk):
+        self.received += len(chunk)
+        if self.received > self.upload_size:
+            raise ValueError('more data than announced')
+        self.upload.feed(chunk)
+        image = self.upload.image
+        if image is not None and image.size[0] * image.size[1] > maxPixels:
+            raise ValueError('image too large')
+        self.write_message('ok %d' % self.received)
+
+    def end_upload(self):
+        if self.upload is None:
+            raise ValueError('no upload in progress')
+        parser, self.upload = self.upload, None
+        if self.received != self.upload_size:
+            raise ValueError('expected %d bytes, received %d' %
+                             (self.upload_size, self.received))
+        self.print_image(parser.close())
+
+    def print_image(self, image):
+        if image.size[0] * image.size[1] > maxPixels:
+            raise ValueError('image too large')
         print_order = PrintOrder(printer.print_image, image)
         printer.queue.put(print_order)
 
@@ -40,4 +114,3 @@ def run_webservice():
     http_server = tornado.httpserver.HTTPServer(application)
     http_server.listen(8888)
     tornado.ioloop.IOLoop.instance().start()
-    
\ No newline at end of file
@@ -0,0 +1,225 @@
+# Crash-safe print spool.
+#
+# Jobs waiting in printer.queue, or in a PrintScheduler, are in memory
+# only: a reboot (hold()) or crash loses them.  A PrintSpool keeps each
+# job on disk, as its compiled PrintJob, until it has been printed:
+#
+#   spool = PrintSpool(scheduler)      # Resumes unfinished jobs
+#   spool.schedule('web', printPhoto, photo)
+#
+# Alongside the job files is an append-only journal of what happened to
+# each job: 'received' (with its priority class), 'started', 'progress'
+# (the split point reached; see printjob.py) and 'completed' (or
+# 'failed', if it couldn't be sent; it isn't retried).  A job's file is
+# deleted once it's done.  On start, the journal is replayed and every
+# job not done is scheduled again, continuing from the last split point
+# reached, so a long image interrupted mid-print doesn't start over.
+# The journal is then compacted to just those jobs.
+#
+# schedule() and submit() return once the job is safely on disk.  To
+# keep a burst of uploads from costing one fsync each, writes are
+# synced in batches: a committer thread waits syncDelay seconds to
+# gather whatever else arrives, then makes one pass of fsyncs for the
+# lot.  Records other than 'received' aren't waited for; losing one in
+# a crash only means printing (part of) a job twice, never losing it.
+
+from __future__ import print_function
+from printjob import PrintJob
+import os, threading, time
+
+class PrintSpool(object):
+
+	syncDelay   = 0.02  # Seconds to gather writes into one fsync
+	compactSize = 65536 # Journal bytes before compacting when idle
+
+	def __init__(self, scheduler, path='~/.cache/Adafruit_Thermal/spool'):
+		self.scheduler = scheduler
+		self.path      = os.path.expanduser(path)
+		self.journal   = os.path.join(self.path, 'journal')
+		self.lock      = threading.Lock()
+		self.cond      = threading.Condition(self.lock)
+		self.written   = 0  # Writes made...
+		self.synced    = 0  # ...and how many of those are synced
+		self.dirty     = [] # Job files written since the last sync
+		self.active    = {} # Job id: (class, offset reached)
+		self.nextId    = 1
+		if not os.path.isdir(self.path):
+			os.makedirs(self.path)
+
+		pending = self.replay()
+		self.compact()
+		self.log = open(self.journal, 'a')
+		t = threading.Thread(target=self.commit)
+		t.daemon = True
+		t.start()
+		for id, cls, pos, job in pending:
+			self.scheduler.submit(cls, job, pos=pos,
+			  callback=self.callback(id))
+
+	# Compiles and spools func(printer, *args, **kwargs), as for
+	# PrintScheduler.schedule().
+	def schedule(self, cls, func, *args, **kwargs):
+		return self.submit(cls, self.prepare(func, *args, **kwargs))
+
+	# Compiles a job for submit(), as PrintScheduler.prepare().
+	def prepare(self, func, *args, **kwargs):
+		return self.scheduler.prepare(func, *args, **kwargs)
+
+	# Spools a compiled PrintJob and schedules it.  'enqueued' and
+	# 'callback' are as for PrintScheduler.submit().
+	def submit(self, cls, job, enqueued=None, callback=None):
+		with self.lock:
+			id = self.nextId
+			self.nextId += 1
+			self.active[id] = (cls, 0) # So compacting keeps the file
+		name = self.jobPath(id)
+		with open(name, 'wb') as f:
+			f.write(job.dumps())
+		with self.lock:
+			self.dirty.append(name)
+		self.record(id, 'received', cls, wait=True)
+		return self.scheduler.submit(cls, job, enqueued,
+		  callback=self.callback(id, callback))
+
+	def jobPath(self, id):
+		return os.path.join(self.path, '%08d.job' % id)
+
+	# Journals a job's progress, then passes events on to 'then'.
+	def callback(self, id, then=None):
+		def event(entry, name):
+			if name == 'progress':
+				with self.lock:
+					self.active[id] = (entry.cls, entry.pos)
+				self.record(id, name, entry.pos)
+			elif name in ('completed', 'failed'):
+				with self.lock:
+					self.active.pop(id, None)
+				self.record(id, name)
+				try:
+					os.remove(self.jobPath(id))
+				except OSError:
+					pass
+				self.maybeCompact()
+			else:
+				self.record(id, name)
+			if then is not None:
+				then(entry, name)
+		return event
+
+	# Appends a journal record; if 'wait', returns once it's synced.
+	def record(self, id, event, arg=None, wait=False):
+		line = '%d %s' % (id, event)
+		if arg is not None:
+			line += ' %s' % arg
+		with self.cond:
+			self.log.write(line + '\n')
+			self.log.flush()
+			self.written += 1
+			target = self.written
+			self.cond.notify_all()
+			while wait and self.synced < target:
+				self.cond.wait()
+
+	# Committer thread: syncs batches of writes.
+	def commit(self):
+		while True:
+			with self.cond:
+				while self.synced == self.written:
+					self.cond.wait()
+			time.sleep(self.syncDelay) # Let a burst gather
+			with self.cond:
+				target     = self.written
+				files      = self.dirty
+				self.dirty = []
+				fd         = self.log.fileno()
+			for name in files:
+				self.fsync(name)
+			if files:
+				self.fsync(self.path) # New directory entries
+			os.fsync(fd)
+			with self.cond:
+				self.synced = target
+				self.cond.notify_all()
+
+	def fsync(self, name):
+		try:
+			fd = os.open(name, os.O_RDONLY)
+		except OSError:
+			return # Already removed, or directories can't be opened
+		try:
+			os.fsync(fd)
+		except OSError:
+			pass
+		finally:
+			os.close(fd)
+
+	# Reads the journal, returning unfinished jobs as (id, class,
+	# offset, job) in the order received.  A torn last line (from a
+	# crash mid-write) is ignored.
+	def replay(self):
+		jobs = {}
+		try:
+			with open(self.journal) as f:
+				lines = f.read().split('\n')[:-1]
+		except (IOError, OSError):
+			lines = []
+		for line in lines:
+			fields = line.split()
+			try:
+				id = int(fields[0])
+				self.nextId = max(self.nextId, id + 1)
+				if fields[1] == 'received':
+					jobs[id] = [ fields[2], 0 ]
+				elif fields[1] == 'progress' and id in jobs:
+					jobs[id][1] = int(fields[2])
+				elif fields[1] in ('completed', 'failed'):
+					jobs.pop(id, None)
+			except (IndexError, ValueError):
+				continue
+
+		pending = []
+		for id in sorted(jobs):
+			cls, pos = jobs[id]
+			try:
+				job = PrintJob.load(self.jobPath(id))
+			except (IOError, OSError, ValueError):
+				continue # Lost before it was synced; nothing to print
+			if cls not in self.scheduler.classes:
+				cls = 'web'
+			self.active[id] = (cls, pos)
+			pending.append((id, cls, pos, job))
+		return pending
+
+	# Rewrites the journal with only the active jobs, and deletes the
+	# files of jobs no longer needed.
+	def compact(self):
+		tmp = self.journal + '.tmp'
+		with open(tmp, 'w') as f:
+			for id in sorted(self.active):
+				cls, pos = self.active[id]
+				f.write('%d received %s\n' % (id, cls))
+				if pos:
+					f.write('%d progress %d\n' % (id, pos))
+			f.flush()
+			os.fsync(f.fileno())
+		os.rename(tmp, self.journal)
+		self.fsync(self.path)
+		for name in os.listdir(self.path):
+			if name.endswith('.job'):
+				try:
+					id = int(name[:-4])
+				except ValueError:
+					continue
+				if id not in self.active:
+					os.remove(os.path.join(self.path, name))
+
+	# Compacts the journal once it's grown large and nothing's pending.
+	def maybeCompact(self):
+		with self.cond:
+			if self.active or self.log.tell() < self.compactSize:
+				return
+			while self.synced < self.written:
+				self.cond.wait()
+			self.log.close()
+			self.compact()
+			self.log = open(self.journal, 'a')
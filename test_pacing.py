@@ -0,0 +1,35 @@
+# Checks that bitmaps sent at the faster baud rates don't overrun the
+# printer's receive buffer, using the emulator (see emulator.py).  Run
+# with 'python -m unittest test_pacing' (or pytest).
+
+from __future__ import print_function
+from Adafruit_Thermal import Adafruit_Thermal
+from emulator import PrinterEmulator
+from PIL import Image
+import os, unittest
+
+face = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+  'gfx', 'face01.png')
+
+class BitmapPacingTest(unittest.TestCase):
+
+	def printFace(self, baudrate, **kwargs):
+		emulator = PrinterEmulator(baudrate=baudrate)
+		printer  = Adafruit_Thermal(None, baudrate,
+		  transport=emulator, profile=None, **kwargs)
+		printer.printImage(Image.open(face))
+		printer.feed(2)
+		return emulator.report()
+
+	def testBitmap(self):
+		for baudrate in (38400, 115200):
+			self.assertEqual(self.printFace(baudrate)['overruns'], 0)
+
+	def testRaster(self):
+		for baudrate in (38400, 115200):
+			self.assertEqual(
+			  self.printFace(baudrate, raster=True)['overruns'], 0)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,70 @@
+# Regression test for Adafruit_Thermal.rasterize(): its packed output
+# must match, byte for byte, that of the per-pixel loop printImage()
+# used before it.  Run with 'python -m unittest test_rasterize' (or
+# pytest).
+
+from __future__ import print_function
+from Adafruit_Thermal import Adafruit_Thermal
+from emulator import PrinterEmulator
+from PIL import Image
+import glob, os, random, unittest
+
+# The original conversion loop, kept as the reference.
+def referenceBitmap(image):
+	if image.mode != '1':
+		image = image.convert('1')
+
+	width  = image.size[0]
+	height = image.size[1]
+	if width > 384:
+		width = 384
+	rowBytes = (width + 7) // 8
+	bitmap   = bytearray(rowBytes * height)
+	pixels   = image.load()
+
+	for y in range(height):
+		n = y * rowBytes
+		x = 0
+		for b in range(rowBytes):
+			sum = 0
+			bit = 128
+			while bit > 0:
+				if x >= width: break
+				if pixels[x, y] == 0:
+					sum |= bit
+				x    += 1
+				bit >>= 1
+			bitmap[n + b] = sum
+
+	return width, height, bitmap
+
+
+class RasterizeTest(unittest.TestCase):
+
+	def setUp(self):
+		self.printer = Adafruit_Thermal(None, 9600,
+		  transport=PrinterEmulator(), profile=None)
+
+	def check(self, image):
+		self.assertEqual(self.printer.rasterize(image),
+		  referenceBitmap(image))
+
+	def testWidths(self):
+		rand = random.Random(1)
+		for width in range(1, 501):
+			image = Image.new('L', (width, 3))
+			image.putdata([ rand.randint(0, 255)
+			  for i in range(width * 3) ])
+			self.check(image)
+
+	def testGfx(self):
+		gfx = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+		  'gfx', '*.png')
+		names = sorted(glob.glob(gfx))
+		self.assertTrue(names)
+		for name in names:
+			self.check(Image.open(name))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -15,6 +15,7 @@
 
 from __future__ import print_function
 from Adafruit_Thermal import *
+import printerd
 from xml.dom.minidom import parseString
 import Image, ImageDraw, time, urllib
 
@@ -168,6 +169,8 @@ if windUnits == 'km/h': img.paste(Kph, (x, y))
 else:                  img.paste(Mph, (x, y))
 
 # Open connection to printer and print image
-printer = Adafruit_Thermal("/dev/ttyAMA0", 9600, timeout=5)
-printer.printImage(img, True)
-printer.feed(7)
\ No newline at end of file
+printer = printerd.connect("/dev/ttyAMA0", 9600, timeout=5,
+                           priority='tap')
+with printer.job('timetemp'): # Stats logged if ADAFRUIT_THERMAL_STATS set
+	printer.printImage(img, True)
+	printer.feed(7)
\ No newline at end of file
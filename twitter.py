@@ -30,6 +30,8 @@ from __future__ import print_function
 import base64, HTMLParser, httplib, json, sys, urllib, zlib, subprocess, time, Image
 from unidecode import unidecode
 from Adafruit_Thermal import *
+from bitmapcache import BitmapCache
+import printerd
 
 
 # Configurable globals.  Edit to your needs. -------------------------------
@@ -47,7 +49,8 @@ queryString = 'from:Adafruit'
 
 # Other globals.  You probably won't need to change these. -----------------
 
-printer   = Adafruit_Thermal("/dev/ttyAMA0", 9600, timeout=5)
+printer   = printerd.connect("/dev/ttyAMA0", 9600, timeout=5,
+                             cache=BitmapCache(), priority='feed')
 host      = 'api.twitter.com'
 authUrl   = '/oauth2/token'
 searchUrl = '/1.1/search/tweets.json?'
@@ -104,30 +107,32 @@ data = issueRequestAndDecodeResponse(
 maxId = data['search_metadata']['max_id_str']
 statuses = data['statuses']
 
-for tweet in statuses:
+with printer.job('twitter'): # Stats logged if ADAFRUIT_THERMAL_STATS set
 
-  printer.inverseOn()
-  printer.print(' ' + '{:<31}'.format(tweet['user']['screen_name']))
-  printer.inverseOff()
+  for tweet in statuses:
 
-  printer.underlineOn()
-  printer.print('{:<32}'.format(tweet['created_at']))
-  printer.underlineOff()
+    printer.inverseOn()
+    printer.print(' ' + '{:<31}'.format(tweet['user']['screen_name']))
+    printer.inverseOff()
 
-  # max_id_str is not always present, so check tweet IDs as fallback
-  id = tweet['id_str']
-  if(id > maxId): maxId = id # String compare is OK for this
+    printer.underlineOn()
+    printer.print('{:<32}'.format(tweet['created_at']))
+    printer.underlineOff()
 
-  # Remove HTML escape sequences
-  # and remap Unicode values to nearest ASCII equivalents
-  printer.print(unidecode(HTMLParser.HTMLParser().unescape(tweet['text'])))
-  time.sleep(3)
-  printer.feed(3)
-  
-if len(statuses) > 0:
-  time.sleep(3)
-  printer.feed(5)
-  printer.printImage(Image.open('gfx/face01.png'), True)
-  printer.feed(7)
+    # max_id_str is not always present, so check tweet IDs as fallback
+    id = tweet['id_str']
+    if(id > maxId): maxId = id # String compare is OK for this
+
+    # Remove HTML escape sequences
+    # and remap Unicode values to nearest ASCII equivalents
+    printer.print(unidecode(HTMLParser.HTMLParser().unescape(tweet['text'])))
+    time.sleep(3)
+    printer.feed(3)
   
+  if len(statuses) > 0:
+    time.sleep(3)
+    printer.feed(5)
+    printer.printImage(Image.open('gfx/face01.png'), True)
+    printer.feed(7)
+
 print(maxId) # Piped back to calling process